@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+YouTube request side of the caption collectors (testingV*.py)
+
+• AdaptivePacer: one request budget shared by every engine; AIMD on the
+  delay, holds on 429 / "try again later" (honours Retry-After), probes
+  before resuming, logs every decision
+• PacedYoutubeDL: a YoutubeDL whose every HTTP request goes through the pacer
+• parse_retry_after / rate_limit_hint: how long the server wants us to wait
+• throttle_recorded: whether the pacer already saw an error's 429
+• pick_subtitle_track / download_captions: the one best subtitle track per
+  video, fetched into memory, in a format caption_text can parse
+
+The collectors keep their own tuning constants and pass them in.
+"""
+
+import re, sys, time, datetime, threading
+import email.utils
+from typing import List, Tuple, Optional
+from yt_dlp import YoutubeDL
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import HTTPError
+from yt_dlp.utils import DownloadError
+
+# =======================
+# Defaults
+# =======================
+SUB_LANGS         = ["en", "en-US", "en-GB"]      # preference order; variants rank after exact
+SUB_FORMATS       = ["srt", "vtt", "json3"]       # formats caption_text parses, in preference order
+MIN_DELAY_S       = 0.5            # fastest pacing the controller may reach
+MAX_DELAY_S       = 60.0           # slowest pacing
+DELAY_STEP_S      = 0.2            # speed-up per clean window
+AIMD_WINDOW       = 40             # requests per evaluation window
+REQUEST_BURST     = 3              # requests allowed back-to-back after idling
+PROBE_URL         = "https://www.youtube.com/robots.txt"  # probe fallback when no throttled request is known
+
+# Hold when rate-limited and the server gives no Retry-After
+BACKOFF_SCHEDULE  = [300, 600, 1200, 1800]  # 5m, 10m, 20m, 30m
+
+# =======================
+# Request pacing
+# =======================
+class AdaptivePacer:
+    """
+    Request pacing shared by every engine, tuned from what the server says.
+
+    Requests are spaced ``delay`` seconds apart (token bucket, small burst).
+    AIMD: after every ``window`` requests with no 429 the delay shrinks by
+    ``step``; each 429 doubles it.  When YouTube says to stop (429 with
+    Retry-After, or a "try again later" error) everyone holds for the
+    hinted time, or the next ``backoff`` step without a hint, and one
+    probe must succeed before full-rate traffic resumes.  The probe
+    re-issues the last throttled request, since an unthrottled URL would
+    always pass.
+    Every decision is printed and appended to the pacing log.
+    """
+
+    def __init__(self, rpm: float, min_delay: float = MIN_DELAY_S, max_delay: float = MAX_DELAY_S,
+                 step: float = DELAY_STEP_S, window: int = AIMD_WINDOW, burst: int = REQUEST_BURST,
+                 backoff: List[float] = BACKOFF_SCHEDULE):
+        self.delay = min(max_delay, max(min_delay, 60.0 / rpm))
+        self.min_delay, self.max_delay, self.step = min_delay, max_delay, step
+        self.window, self.burst = window, burst
+        self.backoff = backoff
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+        self.hold_until = 0.0
+        self.need_probe = False
+        self.probing = False
+        self.probe_target = None         # last throttled request; what the probe re-issues
+        self.streak = 0                  # holds since the last clean window
+        self.ok = self.throttled = 0     # current window
+        self.requests = self.total_throttled = self.holds = 0
+        self.log_file: Optional[str] = None
+        self.cond = threading.Condition()
+
+    # -- bookkeeping ------------------------------------------------------
+    def set_log(self, path: str):
+        self.log_file = path
+        self._log("start", f"{60 / self.delay:.1f} req/min")
+
+    def _log(self, event: str, detail: str):
+        # callers hold self.cond
+        print(f"  ⚙ pacing {event}: {detail} (delay {self.delay:.2f}s)")
+        if self.log_file:
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(f"{datetime.datetime.now().isoformat(timespec='seconds')}\t{event}\t"
+                        f"{self.delay:.2f}\t{detail}\n")
+
+    def _start_hold(self, hint: Optional[float], why: str):
+        wait = hint if hint else self.backoff[min(self.streak, len(self.backoff) - 1)]
+        self.streak += 1
+        self.holds += 1
+        self.hold_until = time.monotonic() + wait
+        self.need_probe = True
+        self.tokens = 0.0
+        self.ok = self.throttled = 0
+        src = "server hint" if hint else f"backoff step {self.streak}"
+        self._log("hold", f"{why}; waiting {wait:.0f}s ({src}), then probing")
+        self.cond.notify_all()
+
+    # -- called around every request ---------------------------------------
+    def acquire(self, probe=None):
+        """Block until this request may go out; ``probe`` runs the resume check if it falls to us."""
+        while True:
+            with self.cond:
+                now = time.monotonic()
+                if now < self.hold_until:
+                    self.cond.wait(self.hold_until - now)
+                    continue
+                if self.need_probe and (self.probing or probe is None):
+                    self.cond.wait(1.0)
+                    continue
+                if not self.need_probe:
+                    rate = 1.0 / self.delay
+                    self.tokens = min(self.burst, self.tokens + (now - self.stamp) * rate)
+                    self.stamp = now
+                    self.tokens -= 1
+                    self.requests += 1
+                    wait = -self.tokens / rate if self.tokens < 0 else 0.0
+                    break
+                self.probing = True
+            ok, hint = probe()
+            with self.cond:
+                self.probing = False
+                self.requests += 1
+                if ok:
+                    self.need_probe = False
+                    self.stamp = time.monotonic()
+                    self._log("resume", "probe succeeded")
+                    self.cond.notify_all()
+                else:
+                    self.total_throttled += 1
+                    self._start_hold(hint, "probe still throttled")
+        time.sleep(wait)
+        with self.cond:
+            blocked = self.need_probe or time.monotonic() < self.hold_until
+        if blocked:  # a hold began while we slept
+            self.acquire(probe)
+
+    def record_ok(self):
+        with self.cond:
+            self.ok += 1
+            if self.ok + self.throttled >= self.window:
+                self._end_window()
+
+    def record_throttle(self, hint: Optional[float] = None, why: str = "HTTP 429", hold: bool = False,
+                        retry=None):
+        """
+        A request was throttled.  ``hold`` (or a server hint) pauses everyone;
+        ``retry`` (the request, or a URL hitting the same endpoint) is what
+        the resume probe sends.
+        """
+        with self.cond:
+            if retry is not None:
+                self.probe_target = retry
+            self.throttled += 1
+            self.total_throttled += 1
+            now = time.monotonic()
+            if self.need_probe or now < self.hold_until:
+                # already backing off; a server hint can only lengthen it
+                if hint and now + hint > self.hold_until:
+                    self.hold_until = now + hint
+                    self._log("extend", f"{why}; server asks for {hint:.0f}s")
+                return
+            old = self.delay
+            self.delay = min(self.max_delay, self.delay * 2)
+            if hint or hold:
+                self._start_hold(hint, why)
+            else:
+                self._log("slow", f"{why}; was {old:.2f}s")
+
+    def _end_window(self):
+        total = self.ok + self.throttled
+        ratio = self.throttled / total
+        if self.throttled == 0:
+            old = self.delay
+            self.delay = max(self.min_delay, self.delay - self.step)
+            self.streak = 0
+            if self.delay != old:
+                self._log("speed-up", f"{total} requests clean; was {old:.2f}s")
+        else:
+            self._log("window", f"{self.throttled}/{total} throttled ({ratio:.0%}); holding pace")
+        self.ok = self.throttled = 0
+
+    def report(self) -> str:
+        return (f"{self.requests} requests, {self.total_throttled} throttled, {self.holds} holds; "
+                f"final pace {60 / self.delay:.1f} req/min")
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.datetime.now(when.tzinfo)).total_seconds())
+
+def _error_chain(err: BaseException):
+    """``err`` and everything it wraps (yt-dlp's exc_info / cause, __cause__, __context__)."""
+    seen = set()
+    stack = [err]
+    while stack:
+        e = stack.pop()
+        if e is None or id(e) in seen:
+            continue
+        seen.add(id(e))
+        yield e
+        exc_info = getattr(e, "exc_info", None)
+        stack += [exc_info[1] if exc_info else None, getattr(e, "cause", None),
+                  e.__cause__, e.__context__]
+
+def rate_limit_hint(err: BaseException) -> Optional[float]:
+    """Seconds to wait suggested by a throttling error: Retry-After header or "try again in N minutes"."""
+    for e in _error_chain(err):
+        response = getattr(e, "response", None)
+        if response is not None:
+            hint = parse_retry_after(response.headers.get("Retry-After"))
+            if hint is not None:
+                return hint
+        m = re.search(r"(?:retry|try again)\s+(?:after|in)\s+(\d+)\s*(s|sec|second|m|min|minute|h|hour)",
+                      str(e), re.I)
+        if m:
+            return float(m.group(1)) * {"s": 1, "m": 60, "h": 3600}[m.group(2)[0].lower()]
+    return None
+
+def throttle_recorded(err: BaseException) -> bool:
+    """True when a PacedYoutubeDL already fed this error's 429 to the pacer (don't count it twice)."""
+    return any(getattr(e, "paced", False) for e in _error_chain(err))
+
+class PacedYoutubeDL(YoutubeDL):
+    """YoutubeDL whose every HTTP request (pages, API, subtitle files) goes through the pacer."""
+
+    probe_url = PROBE_URL
+
+    def __init__(self, params: dict, pacer: Optional[AdaptivePacer] = None):
+        self.pacer = pacer
+        super().__init__(params)
+
+    def urlopen(self, req):
+        if not self.pacer:
+            return super().urlopen(req)
+        self.pacer.acquire(self._probe)
+        try:
+            res = super().urlopen(req)
+        except HTTPError as e:
+            if e.status == 429:
+                self.pacer.record_throttle(parse_retry_after(e.response.headers.get("Retry-After")),
+                                           why=f"HTTP 429 from {getattr(req, 'url', req)}",
+                                           hold=True, retry=req.copy() if isinstance(req, Request) else req)
+                e.paced = True  # see throttle_recorded
+            raise
+        self.pacer.record_ok()
+        return res
+
+    def _probe(self):
+        """Re-send the throttled request to see whether the block has lifted: (ok, retry-after hint)."""
+        try:
+            super().urlopen(self.pacer.probe_target or self.probe_url).close()
+        except HTTPError as e:
+            if e.status == 429:
+                return False, parse_retry_after(e.response.headers.get("Retry-After"))
+        except Exception:
+            return False, None
+        return True, None
+
+# =======================
+# Subtitle track
+# =======================
+def _lang_rank(lang: str, prefs: List[str]) -> Optional[Tuple[int, int]]:
+    """(preference index, 0 exact / 1 variant) for the best-matching entry in ``prefs``."""
+    lang = lang.lower()
+    best = None
+    for i, pref in enumerate(p.lower() for p in prefs):
+        if lang == pref:
+            rank = (i, 0)
+        elif lang.split("-")[0] == pref.split("-")[0]:
+            rank = (i, 1)   # en-GB / en-orig for "en"
+        else:
+            continue
+        if best is None or rank < best:
+            best = rank
+    return best
+
+def pick_subtitle_track(info: dict, langs: Optional[List[str]] = None,
+                        formats: Optional[List[str]] = None) -> Optional[Tuple[str, str, dict]]:
+    """
+    Choose the single track worth downloading from the video's metadata:
+    manual before auto-generated, then earlier in ``langs``, then exact
+    language before variants.  Tracks offered only in other formats
+    (srv3, ttml, …) are skipped.  Returns (lang, "manual"|"auto", format) or None.
+    """
+    langs = langs or SUB_LANGS
+    formats = formats or SUB_FORMATS
+    best = None
+    for kind, pool in (("manual", info.get("subtitles")), ("auto", info.get("automatic_captions"))):
+        for lang, fmts in (pool or {}).items():
+            rank = _lang_rank(lang, langs) if fmts and lang != "live_chat" else None
+            if rank is None:
+                continue
+            key = (kind == "auto", *rank)
+            if best is not None and key >= best[0]:
+                continue
+            fmt = next((f for ext in formats for f in reversed(fmts) if f.get("ext") == ext), None)
+            if fmt is not None:
+                best = (key, lang, kind, fmt)
+    if best is None:
+        return None
+    _, lang, kind, fmt = best
+    return lang, kind, fmt
+
+def download_captions(ydl: YoutubeDL, video_url: str, langs: Optional[List[str]] = None,
+                      formats: Optional[List[str]] = None) -> Tuple[str, Optional[tuple], dict]:
+    """Fetch only the best subtitle track into memory: (id, (lang, kind, ext, text) or None, info)."""
+    info = ydl.extract_info(video_url, download=False)
+    vid  = info.get("id")
+    pick = pick_subtitle_track(info, langs, formats)
+    if pick is None:
+        return vid, None, info
+    lang, kind, fmt = pick
+    data = fmt.get("data")
+    if data is None:
+        try:
+            with ydl.urlopen(Request(fmt["url"], headers=fmt.get("http_headers") or {})) as r:
+                data = r.read().decode("utf-8", "replace")
+        except HTTPError as e:
+            # surface like yt-dlp's own errors so rate limits are recognised
+            raise DownloadError(f"Unable to download {lang} subtitles: {e}", sys.exc_info())
+    return vid, (lang, kind, fmt["ext"], data), info
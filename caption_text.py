@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Caption → plain text for the YouTube caption collectors (testingV*.py)
+
+• SRT, WebVTT and YouTube json3, parsed cue by cue with precompiled patterns
+• Inline markup stripped: <i>, <font>, <c.colorXXXXXX>, VTT word timings
+  like <00:00:01.234>, {\\an8} positioning, HTML entities
+• Rolling auto-captions collapsed: YouTube repeats each line as it scrolls
+  (and grows lines word by word), so every new line is matched against the
+  tail of what was already written and only the new words are kept
+
+Benchmark over a folder of caption files (e.g. subs/ from --keep-subs):
+  python caption_text.py captions/SomeChannel/subs
+"""
+
+import os, re, io, sys, gzip, json, time, html, argparse
+from typing import Iterable, Iterator, List, Optional
+
+TAG_RE      = re.compile(r"<[^>]*>|\{\\[^}]*\}")   # <i>, <c.color>, <00:00:01.000>, {\an8}
+TIMING_RE   = re.compile(r"^\s*(?:\d+:)?\d+:\d+[.,]\d+\s*-->")
+VTT_HEAD_RE  = re.compile(r"^(?:WEBVTT\b|Kind:|Language:)")   # header lines, before the first cue
+VTT_BLOCK_RE = re.compile(r"^(?:NOTE|STYLE|REGION)\b")        # non-cue blocks, first line of a block
+
+TAIL_WORDS        = 40   # how much already-written text a new line is compared against
+MIN_OVERLAP_WORDS = 3    # shorter partial overlaps are left alone ("the", "no no")
+
+# =======================
+# Cue readers
+# =======================
+def iter_srt_lines(lines: Iterable[str], vtt: bool = False) -> Iterator[str]:
+    """
+    Text lines of an SRT stream (or WebVTT with ``vtt``), without numbers,
+    timings or headers.  VTT header lines only count before the first cue,
+    and NOTE/STYLE/REGION only as the first line of a block, so caption
+    text like "NOTE THE TIME." survives.
+    """
+    in_block = False     # inside a NOTE/STYLE/REGION block
+    block_start = True   # next line opens a block (start of file / after a blank)
+    in_cues = not vtt
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            in_block = False
+            block_start = True
+            continue
+        first, block_start = block_start, False
+        if in_block:
+            continue
+        if "-->" in line and TIMING_RE.match(line):
+            in_cues = True
+            continue
+        if first and line.isdigit():
+            continue  # cue number; a digit-only caption line ("42") is text
+        if vtt:
+            if first and line[0] in "NSR" and VTT_BLOCK_RE.match(line):
+                in_block = True   # skip the whole block, bodies included
+                continue
+            if not in_cues and line[0] in "WKL" and VTT_HEAD_RE.match(line):
+                continue
+        yield line
+
+def iter_json3_lines(data: str) -> Iterator[str]:
+    """Text lines of YouTube's json3 format (events → segs → utf8)."""
+    for event in json.loads(data).get("events") or ():
+        segs = event.get("segs")
+        if not segs:
+            continue
+        for line in "".join(s.get("utf8", "") for s in segs).split("\n"):
+            if line.strip():
+                yield line
+
+def detect_format(data: str, ext: Optional[str] = None) -> str:
+    ext = (ext or "").lower().lstrip(".")
+    if ext in ("srt", "vtt", "json3"):
+        return ext
+    head = data.lstrip("\ufeff \r\n")[:16]
+    if head.startswith("WEBVTT"):
+        return "vtt"
+    if head.startswith("{"):
+        return "json3"
+    return "srt"
+
+# =======================
+# Cleanup + rolling dedupe
+# =======================
+def clean_line(line: str) -> str:
+    if "<" in line or "{" in line:
+        line = TAG_RE.sub("", line)
+    if "&" in line:
+        line = html.unescape(line)
+    return " ".join(line.split())
+
+class RollingDedupe:
+    """
+    Drops the part of each new line that repeats the end of the text so far.
+
+    Keeps the last ``tail`` words written; for a new line finds the longest
+    prefix that equals a suffix of that tail and emits only the rest.  The
+    whole line is dropped when it is already contained at the tail.
+    """
+
+    def __init__(self, tail: int = TAIL_WORDS, min_overlap: int = MIN_OVERLAP_WORDS):
+        self.tail: List[str] = []
+        self.size = tail
+        self.min_overlap = min_overlap
+
+    def feed(self, line: str) -> Optional[str]:
+        words = line.split()
+        folded = line.lower().split()
+        if not words:
+            return None
+        if len(folded) != len(words):
+            folded = [w.lower() for w in words]
+        tail = self.tail
+        # longest prefix of the line that is a suffix of the tail: only
+        # positions where the tail holds the line's first word can start one
+        overlap = 0
+        first, n, t = folded[0], len(folded), len(tail)
+        for i in range(max(0, t - n), t):
+            if tail[i] == first and tail[i:] == folded[:t - i]:
+                overlap = t - i
+                break
+        if overlap < self.min_overlap:
+            overlap = 0  # too short to be a repeat ("no" after "I said no")
+        elif overlap == n:
+            return None
+        words, folded = words[overlap:], folded[overlap:]
+        tail.extend(folded)
+        if len(tail) > 2 * self.size:
+            del tail[:-self.size]
+        return " ".join(words)
+
+def iter_caption_text(data: str, ext: Optional[str] = None, dedupe: bool = True) -> Iterator[str]:
+    """Stream clean, de-duplicated text lines from SRT / VTT / json3 captions."""
+    fmt = detect_format(data, ext)
+    lines = iter_json3_lines(data) if fmt == "json3" else iter_srt_lines(io.StringIO(data), fmt == "vtt")
+    feed = RollingDedupe().feed if dedupe else None
+    for line in lines:
+        if "<" in line or "{" in line or "&" in line:
+            line = clean_line(line)
+        if feed:
+            line = feed(line)   # also squeezes whitespace
+        elif line:
+            line = " ".join(line.split())
+        if line:
+            yield line
+
+def captions_to_text(data: str, ext: Optional[str] = None, dedupe: bool = True) -> str:
+    """Plain "paper style" transcript, one caption line per line."""
+    return "\n".join(iter_caption_text(data, ext, dedupe))
+
+# =======================
+# Benchmark
+# =======================
+def legacy_srt_to_plain_text(srt: str) -> str:
+    """What the collectors did before: drop numbers/timings, squeeze whitespace, keep everything else."""
+    out = []
+    for line in srt.splitlines():
+        if not line or line.isdigit() or "-->" in line:
+            continue
+        cleaned = re.sub(r"\s+", " ", line).strip()
+        if cleaned:
+            out.append(cleaned)
+    return "\n".join(out)
+
+def load_corpus(folder: str) -> List[tuple]:
+    """(name, ext, text) for every .srt/.vtt/.json3 file (optionally .gz) under ``folder``."""
+    corpus = []
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            base = name[:-3] if name.endswith(".gz") else name
+            ext = base.rsplit(".", 1)[-1].lower()
+            if ext not in ("srt", "vtt", "json3"):
+                continue
+            path = os.path.join(root, name)
+            opener = gzip.open if name.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+                corpus.append((name, ext, f.read()))
+    return corpus
+
+def _timed(fn, corpus, repeat: int):
+    best, out = None, 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = sum(len(fn(data, ext).encode("utf-8")) for _, ext, data in corpus)
+        took = time.perf_counter() - t0
+        best = took if best is None else min(best, took)
+    return best, out
+
+def benchmark(folder: str, repeat: int = 3) -> int:
+    corpus = load_corpus(folder)
+    if not corpus:
+        print(f"No .srt/.vtt/.json3 files under {folder}")
+        return 1
+    by_ext = {}
+    for item in corpus:
+        by_ext.setdefault(item[1], []).append(item)
+
+    print(f"Corpus: {len(corpus)} files under {folder}  (best of {repeat})")
+    print(f"{'format':<7}{'files':>6}{'in MB':>9}{'old MB/s':>10}{'new MB/s':>10}"
+          f"{'old out':>10}{'new out':>10}{'smaller':>9}")
+    for ext, items in sorted(by_ext.items()) + [("all", corpus)]:
+        size = sum(len(d.encode("utf-8")) for _, _, d in items) / 1e6
+        old_s, old_out = _timed(lambda d, e: legacy_srt_to_plain_text(d), items, repeat)
+        new_s, new_out = _timed(captions_to_text, items, repeat)
+        smaller = 1 - new_out / old_out if old_out else 0.0
+        print(f"{ext:<7}{len(items):>6}{size:>9.2f}{size / old_s:>10.1f}{size / new_s:>10.1f}"
+              f"{old_out / 1e6:>9.2f}M{new_out / 1e6:>9.2f}M{smaller:>9.0%}")
+    print("old = previous srt_to_plain_text (no markup/format handling, no dedupe)")
+    return 0
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark caption → text conversion over a folder of caption files.")
+    p.add_argument("folder", help="Folder with .srt/.vtt/.json3 files (optionally .gz), searched recursively")
+    p.add_argument("--repeat", type=int, default=3, help="Timing runs per format; the best is reported")
+    args = p.parse_args()
+    sys.exit(benchmark(args.folder, args.repeat))
+
+if __name__ == "__main__":
+    main()
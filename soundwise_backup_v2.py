@@ -6,7 +6,7 @@ Soundwise full-library backup v2 - 2025
 Changes from v1:
 - Credentials loaded from .env file (more secure than CLI args)
 - Exponential backoff on download failures
-- Resume capability (skip already-downloaded courses)
+- Resume capability (skip already-downloaded courses and tracks)
 - User-agent header to avoid blocking
 - Better progress reporting
 
@@ -19,6 +19,25 @@ Usage:
 
   # Resume from previous run:
   python soundwise_backup_v2.py --resume
+
+  # Process 4 soundcasts at once (4 pages sharing one login):
+  python soundwise_backup_v2.py --page-workers 4
+
+  # The login session is saved to .soundwise_session.json (owner-only) and
+  # reused until it expires; force a new sign-in with:
+  python soundwise_backup_v2.py --fresh-login
+
+  # Discover only, then report library size and expected transfer time:
+  python soundwise_backup_v2.py --estimate
+
+  # Check old snapshots against their checksums.sha256 files:
+  python soundwise_backup_v2.py --verify SoundwiseBackups
+
+  # Retry downloads from the last discovery without opening a browser:
+  python soundwise_backup_v2.py --from-manifest --resume
+
+  # Stay under 20 Mbit/s during office hours, smallest courses first:
+  python soundwise_backup_v2.py --bandwidth "07:00-19:00=20M" --order smallest
 """
 
 import asyncio
@@ -26,13 +45,22 @@ import csv
 import datetime
 import hashlib
 import re
+import shutil
+import sqlite3
+import statistics
+import time
 import sys
 import os
 import json
 import argparse
+import fnmatch
+import itertools
+import mmap
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import aiohttp
 import aiofiles
 from pathlib import Path
+from urllib.parse import urljoin, urlparse
 from dotenv import load_dotenv
 from slugify import slugify
 from tqdm.asyncio import tqdm
@@ -46,11 +74,42 @@ HEADLESS = os.getenv("SOUNDWISE_HEADLESS", "false").lower() == "true"
 SCROLL_PAUSE_SEC = float(os.getenv("SOUNDWISE_SCROLL_PAUSE", "0.5"))
 ROOT_DIR = Path(os.getenv("SOUNDWISE_OUTPUT_DIR", "SoundwiseBackups")) / datetime.date.today().isoformat()
 CONCURRENCY = int(os.getenv("SOUNDWISE_CONCURRENCY", "6"))
+MAX_CONCURRENCY = max(CONCURRENCY, int(os.getenv("SOUNDWISE_MAX_CONCURRENCY", "0")) or CONCURRENCY * 4)
+ADAPT_WINDOW_SEC = float(os.getenv("SOUNDWISE_ADAPT_WINDOW", "5"))
+CONN_PER_HOST = int(os.getenv("SOUNDWISE_CONN_PER_HOST", "0")) or MAX_CONCURRENCY
+KEEPALIVE_SEC = float(os.getenv("SOUNDWISE_KEEPALIVE", "60"))
+DNS_CACHE_SEC = int(os.getenv("SOUNDWISE_DNS_CACHE", "600"))
+BANDWIDTH = os.getenv("SOUNDWISE_BANDWIDTH", "")  # e.g. "07:00-19:00=20M" (Mbit/s), "" = no cap
+ORDER = os.getenv("SOUNDWISE_ORDER", "discovery").lower()  # discovery | smallest
+PINNED = [p.strip() for p in os.getenv("SOUNDWISE_PINNED", "").split(",") if p.strip()]
+PAGE_WORKERS = int(os.getenv("SOUNDWISE_PAGE_WORKERS", "1"))
+DISCOVERY = os.getenv("SOUNDWISE_DISCOVERY", "harvest").lower()  # harvest | click
+LEAN_PAGES = os.getenv("SOUNDWISE_LEAN_PAGES", "true").lower() == "true"
+DEBUG = os.getenv("SOUNDWISE_DEBUG", "false").lower() == "true"
+# resource types and hosts the lean discovery profile never loads
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+TRACKER_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "facebook.net", "facebook.com", "hotjar.com", "segment.io", "segment.com",
+    "mixpanel.com", "intercom.io", "intercomcdn.com", "fullstory.com",
+    "sentry.io", "stripe.com", "cloudflareinsights.com",
+)
 MAX_RETRIES = int(os.getenv("SOUNDWISE_MAX_RETRIES", "3"))
+PROBE_SEC = float(os.getenv("SOUNDWISE_PROBE_SECONDS", "10"))
+VERIFY_WORKERS = int(os.getenv("SOUNDWISE_VERIFY_WORKERS", "0")) or os.cpu_count() or 4
+APP_URL = os.getenv("SOUNDWISE_APP_URL", "https://app.mysoundwise.com").rstrip("/")
+CARD_SELECTOR = 'a[href*="/mysoundcasts/"] label'
 PLAY_SELECTORS = [
     'div.track-pause-play',      # wrapper around the play icon
     'i.material-icons.play',     # <i> tag itself (fallback)
 ]
+# audio links inside JSON/XHR bodies or the page's embedded state
+AUDIO_URL_RE = re.compile(
+    r'https?://[^\s"\'<>]+?\.(?:mp3|m4a|aac|wav|ogg|oga)(?:\?[^\s"\'<>]*)?',
+    re.I,
+)
+INDEX_HEADER = ["file", "orig_filename", "source_url"]
+GLOBAL_INDEX_HEADER = ["title_slug", *INDEX_HEADER]
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 # ─────────────────────────────────────────────────────────────────────
 
@@ -65,7 +124,24 @@ Environment variables (set in .env file):
   SOUNDWISE_PASSWORD  - Your Soundwise account password
   SOUNDWISE_HEADLESS  - Run browser in headless mode (true/false)
   SOUNDWISE_OUTPUT_DIR - Output directory for backups
-  SOUNDWISE_CONCURRENCY - Number of concurrent downloads
+  SOUNDWISE_APP_URL   - Web app base URL (e.g. the soundwise_bench.py stand-in)
+  SOUNDWISE_CONCURRENCY - Starting number of concurrent downloads
+  SOUNDWISE_MAX_CONCURRENCY - Ceiling for adaptive concurrency (default: 4x start;
+                          set equal to SOUNDWISE_CONCURRENCY for a fixed level)
+  SOUNDWISE_ADAPT_WINDOW - Seconds between concurrency adjustments
+  SOUNDWISE_CONN_PER_HOST - Max open connections per CDN host (default: max concurrency)
+  SOUNDWISE_KEEPALIVE - Seconds to keep idle connections open for reuse
+  SOUNDWISE_DNS_CACHE - Seconds to cache DNS lookups
+  SOUNDWISE_BANDWIDTH - Download bandwidth cap in bits/s, optionally per time of day,
+                          e.g. "20M" or "07:00-19:00=20M,19:00-07:00=0" (0 = no cap)
+  SOUNDWISE_ORDER     - Course download order: "discovery" or "smallest" first
+  SOUNDWISE_PINNED    - Comma-separated course slugs (globs ok) to download first
+  SOUNDWISE_PAGE_WORKERS - Number of browser pages discovering courses at once
+  SOUNDWISE_DISCOVERY - "harvest" (read URLs from app data) or "click" (play each track)
+  SOUNDWISE_LEAN_PAGES - Skip images, fonts, media bodies and trackers (true/false)
+  SOUNDWISE_DEBUG     - Slow down browser actions so they can be watched (true/false)
+  SOUNDWISE_VERIFY_WORKERS - Hashing processes for --verify (default: CPU count)
+  SOUNDWISE_PROBE_SECONDS - Length of the --estimate throughput probe
         """
     )
     parser.add_argument(
@@ -81,7 +157,8 @@ Environment variables (set in .env file):
     parser.add_argument(
         "--resume",
         action="store_true",
-        help="Resume from previous run, skipping already-downloaded courses"
+        help="Resume from previous run, skipping already-downloaded courses "
+             "and tracks, and continuing partially downloaded (.part) tracks"
     )
     parser.add_argument(
         "--headless",
@@ -94,43 +171,334 @@ Environment variables (set in .env file):
         default=str(ROOT_DIR.parent),
         help="Base output directory for backups"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--page-workers",
+        type=int,
+        default=PAGE_WORKERS,
+        help="Number of browser pages processing soundcasts in parallel"
+    )
+    parser.add_argument(
+        "--discovery",
+        choices=["harvest", "click"],
+        default=DISCOVERY,
+        help="harvest: read track URLs from the page's JSON/XHR data, clicking "
+             "play only if nothing is found; click: always click every play button"
+    )
+    parser.add_argument(
+        "--fresh-login",
+        action="store_true",
+        help="Ignore the saved browser session and sign in again"
+    )
+    parser.add_argument(
+        "--full-page-load",
+        dest="lean_pages",
+        action="store_false",
+        default=LEAN_PAGES,
+        help="Load every image, font and script during discovery "
+             "(compare its page-load report against the default lean profile)"
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        default=DEBUG,
+        help="Add slow_mo to browser actions so the run can be watched"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=MAX_CONCURRENCY,
+        help="Upper bound for adaptive download concurrency "
+             "(equal to SOUNDWISE_CONCURRENCY disables adaptation)"
+    )
+    parser.add_argument(
+        "--bandwidth",
+        default=BANDWIDTH,
+        metavar="SCHEDULE",
+        help='Cap total download speed, e.g. "20M" (Mbit/s) or '
+             '"07:00-19:00=20M,19:00-07:00=0" for full speed at night'
+    )
+    parser.add_argument(
+        "--order",
+        choices=["discovery", "smallest"],
+        default=ORDER,
+        help="Download courses in discovery order, or smallest first "
+             "(sizes known from earlier runs) for quick wins"
+    )
+    parser.add_argument(
+        "--pin",
+        action="append",
+        default=list(PINNED),
+        metavar="SLUG",
+        help="Download this course (slug or glob) before all others; repeatable"
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="Discover tracks (or read --from-manifest), total their sizes with "
+             "HEAD requests and estimate transfer time; downloads nothing"
+    )
+    parser.add_argument(
+        "--verify",
+        metavar="DIR",
+        help="Verify every course folder under DIR against its checksums.sha256 "
+             "and exit (no login needed)"
+    )
+    parser.add_argument(
+        "--from-manifest",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PATH",
+        help="Skip the browser and download the tracks recorded in a discovery "
+             "manifest (default: .soundwise_manifest.json in the output dir)"
+    )
+    args = parser.parse_args()
+    try:
+        parse_bandwidth(args.bandwidth)
+    except ValueError as e:
+        parser.error(f"--bandwidth: {e}")
+    return args
 
 
 # ─── small helpers ──────────────────────────────────────────────────
-def sha256sum(p: Path) -> str:
-    h = hashlib.sha256()
+def find_audio_urls(text: str) -> list:
+    """Return audio URLs mentioned in a JSON/HTML body, in order of appearance."""
+    text = text.replace("\\/", "/").replace("\\u002F", "/")
+    return list(dict.fromkeys(AUDIO_URL_RE.findall(text)))
+
+
+def _hash_into(h, p: Path):
     with p.open("rb") as f:
         for chunk in iter(lambda: f.read(8192), b""):
             h.update(chunk)
-    return h.hexdigest()
+    return h
+
+
+def parse_content_range(value):
+    """Parse "bytes START-END/TOTAL" (or "bytes */TOTAL") -> (start, total)."""
+    m = re.match(r"bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)", value or "")
+    if not m:
+        return None, None
+    start = int(m.group(1)) if m.group(1) is not None else None
+    total = int(m.group(2)) if m.group(2) != "*" else None
+    return start, total
+
 
+def _if_range_file(part: Path) -> Path:
+    return part.with_name(part.name + ".ifrange")
+
+
+def save_if_range(part: Path, r):
+    """
+    Remember which version of the file ``part`` holds, as an If-Range value.
+
+    Strong ETags are preferred; weak ones can't be used with If-Range, so
+    Last-Modified is the fallback.  Without either the .part can't be
+    continued safely and no sidecar is written.
+    """
+    etag = r.headers.get("ETag")
+    value = etag if etag and not etag.startswith("W/") else r.headers.get("Last-Modified")
+    sidecar = _if_range_file(part)
+    if value:
+        sidecar.write_text(value, encoding="utf-8")
+    elif sidecar.exists():
+        sidecar.unlink()
+
+
+def load_if_range(part: Path):
+    try:
+        return _if_range_file(part).read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+def discard_part(part: Path):
+    for path in (part, _if_range_file(part)):
+        if path.exists():
+            path.unlink()
+
+
+def parse_rate(value: str):
+    """"20M" / "512k" / "1.5Gbit" (bits/s) -> bytes/sec; 0 or "off" -> None."""
+    m = re.fullmatch(r"\s*([\d.]+)\s*([kmg]?)(?:bit|bps|b)?(?:/s)?\s*", value, re.I)
+    if not m:
+        if value.strip().lower() in ("off", "none", "unlimited"):
+            return None
+        raise ValueError(f"bad rate {value!r}")
+    bits = float(m.group(1)) * {"": 1, "k": 1e3, "m": 1e6, "g": 1e9}[m.group(2).lower()]
+    return bits / 8 or None
+
+
+def parse_bandwidth(spec: str) -> list:
+    """
+    Parse a bandwidth schedule into [(start_min, end_min, bytes_per_sec)].
+
+    A bare rate applies all day; otherwise comma-separated ``HH:MM-HH:MM=RATE``
+    windows, which may wrap past midnight.  Times not covered are uncapped.
+    """
+    windows = []
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        if "=" not in part:
+            if ":" in part:
+                raise ValueError(f"bad window {part!r}, expected HH:MM-HH:MM=RATE")
+            windows.append((0, 24 * 60, parse_rate(part)))
+            continue
+        span, rate = part.split("=", 1)
+        m = re.fullmatch(r"\s*(\d{1,2}):(\d\d)\s*-\s*(\d{1,2}):(\d\d)\s*", span)
+        if not m:
+            raise ValueError(f"bad time window {span!r}, expected HH:MM-HH:MM")
+        h1, m1, h2, m2 = map(int, m.groups())
+        windows.append((h1 * 60 + m1, h2 * 60 + m2, parse_rate(rate)))
+    return windows
+
+
+def url_key(url: str) -> str:
+    """Identify a remote file independent of signed/expiring query strings."""
+    return url.split("?")[0]
+
+
+def remote_unchanged(r, known) -> bool:
+    """True if a 304/200 response describes the same file recorded in ``known``."""
+    if r.status == 304:
+        return True
+    if r.status != 200:
+        return False
+    etag = r.headers.get("ETag")
+    if etag and known.get("etag"):
+        return etag == known["etag"]
+    modified = r.headers.get("Last-Modified")
+    return (bool(modified) and modified == known.get("last_modified")
+            and r.content_length is not None
+            and r.content_length == known.get("content_length"))
+
+
+async def fetch_with_retry(session, url, dest, max_retries=MAX_RETRIES, resume=False,
+                           known=None, meta=None, limiter=None, bandwidth=None):
+    """
+    Fetch URL with exponential backoff on failures.
+
+    Data goes to ``<dest>.part``; retries continue from its current size with
+    a ``Range`` request, and the file is only renamed to ``dest`` once its
+    length matches what the server announced.  With ``resume`` a ``.part``
+    left behind by an earlier run is continued too, otherwise it is discarded.
+    Every Range request carries ``If-Range`` with the validator saved when the
+    .part was started (``.part.ifrange``), so a file that changed since comes
+    back whole instead of being spliced onto the old bytes; a .part without a
+    saved validator is started over.
+
+    The SHA-256 is updated chunk by chunk as data arrives; returns the hex
+    digest on success, None on failure.
+
+    ``known`` holds the etag/last_modified/content_length/sha256 recorded for
+    this URL last time.  They are sent as conditional headers, and if the
+    server reports the file unchanged nothing is written, ``meta["unchanged"]``
+    is set and the recorded digest is returned.  Otherwise ``meta`` receives
+    the new validators.
+
+    With a ``limiter`` (AdaptiveLimit) time-to-first-byte, bytes and failures
+    are reported to it; the caller holds the slot.  A ``bandwidth``
+    (BandwidthCap) is charged for every chunk before the next one is read.
+    """
+    meta = {} if meta is None else meta
+    part = dest.with_name(dest.name + ".part")
+    if not resume and part.exists():
+        discard_part(part)
 
-async def fetch_with_retry(session, url, dest, max_retries=MAX_RETRIES):
-    """Fetch URL with exponential backoff on failures."""
     backoff = 1.0
     last_error = None
+    h, hashed = hashlib.sha256(), 0
+
+    async def catch_up_hash():
+        # only needed when continuing a .part this call did not write itself
+        nonlocal h, hashed
+        if hashed != have:
+            h = await asyncio.to_thread(_hash_into, hashlib.sha256(), part)
+            hashed = have
 
     for attempt in range(max_retries):
+        have = part.stat().st_size if part.exists() else 0
+        if_range = load_if_range(part) if have else None
+        if have and not if_range:
+            # no record of which version these bytes belong to
+            discard_part(part)
+            have = 0
+        headers = {}
+        if have:
+            headers["Range"] = f"bytes={have}-"
+            headers["If-Range"] = if_range
+        elif known:
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            if known.get("last_modified"):
+                headers["If-Modified-Since"] = known["last_modified"]
         try:
-            async with session.get(url) as r:
+            started = time.monotonic()
+            async with session.get(url, headers=headers) as r:
+                if limiter:
+                    limiter.record_ttfb(time.monotonic() - started)
+                if known and not have and remote_unchanged(r, known):
+                    meta["unchanged"] = True
+                    return known["sha256"]
+                if r.status == 416 and have:
+                    # nothing left past `have`: either already complete or stale
+                    _, total = parse_content_range(r.headers.get("Content-Range"))
+                    if total == have:
+                        await catch_up_hash()
+                        os.replace(part, dest)
+                        discard_part(part)
+                        return h.hexdigest()
+                    discard_part(part)
+                    raise IOError(f"stale partial file ({have} bytes), restarting")
                 r.raise_for_status()
-                async with aiofiles.open(dest, "wb") as f:
+
+                if r.status == 206:
+                    start, total = parse_content_range(r.headers.get("Content-Range"))
+                    if start != have:
+                        discard_part(part)
+                        raise IOError(f"server resumed at byte {start}, expected {have}")
+                    await catch_up_hash()
+                    mode = "ab"
+                else:
+                    # full body: no Range sent, the server ignored it, or
+                    # If-Range said the file changed since the .part began
+                    have, total, mode = 0, r.content_length, "wb"
+                    h, hashed = hashlib.sha256(), 0
+                    save_if_range(part, r)
+
+                meta.update(etag=r.headers.get("ETag"),
+                            last_modified=r.headers.get("Last-Modified"),
+                            content_length=total)
+
+                async with aiofiles.open(part, mode) as f:
                     async for chunk in r.content.iter_chunked(1 << 20):
                         await f.write(chunk)
-            return True
+                        h.update(chunk)
+                        if limiter:
+                            limiter.record_bytes(len(chunk))
+                        if bandwidth:
+                            await bandwidth.consume(len(chunk))
+                        have += len(chunk)
+                        hashed = have
+
+            if total is not None and have != total:
+                raise IOError(f"incomplete download: {have} of {total} bytes")
+            os.replace(part, dest)
+            discard_part(part)
+            return h.hexdigest()
         except Exception as e:
+            if limiter:
+                limiter.record_failure(getattr(e, "status", None))
             last_error = e
             if attempt < max_retries - 1:
                 await asyncio.sleep(backoff)
                 backoff *= 2  # Exponential backoff
 
     print(f"   – Failed to download after {max_retries} attempts: {last_error}")
-    return False
+    return None
 
 
 def load_progress(progress_file: Path) -> set:
-    """Load completed courses from progress file."""
+    """Load completed courses from the old JSON progress file."""
     if progress_file.exists():
         try:
             with open(progress_file, "r") as f:
@@ -141,16 +509,564 @@ def load_progress(progress_file: Path) -> set:
     return set()
 
 
-def save_progress(progress_file: Path, completed: set):
-    """Save completed courses to progress file."""
+def manifest_log(manifest_file: Path) -> Path:
+    """Append-only discovery log kept beside the manifest until it is compacted."""
+    return manifest_file.with_suffix(".jsonl")
+
+
+def load_manifest(manifest_file: Path) -> dict:
+    """
+    Load discovered courses (slug -> title/tracks/discovered_at).
+
+    Entries in the discovery log (see append_manifest) override the manifest
+    file.  A missing file is an empty manifest; one that can't be parsed
+    raises ValueError rather than looking empty (and being overwritten).
+    Only a torn last line of the log, from a crash mid-write, is ignored.
+    """
+    courses = {}
+    log = manifest_log(manifest_file)
     try:
-        with open(progress_file, "w") as f:
+        if manifest_file.exists():
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                courses = json.load(f).get("courses", {})
+        if log.exists():
+            lines = log.read_text(encoding="utf-8").split("\n")
+            for i, line in enumerate(lines):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    if i == len(lines) - 1:
+                        break  # unterminated: the write never finished
+                    raise
+                courses[entry.pop("slug")] = entry
+    except (OSError, ValueError, AttributeError, KeyError) as e:
+        raise ValueError(f"Could not read manifest {manifest_file}: {e}") from e
+    return courses
+
+
+def append_manifest(manifest_file: Path, slug: str, entry: dict):
+    """Record one discovered course: a line appended to the log, not a manifest rewrite."""
+    try:
+        with open(manifest_log(manifest_file), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"slug": slug, **entry}) + "\n")
+    except OSError as e:
+        print(f"Warning: Could not record {slug} in the manifest: {e}")
+
+
+def save_manifest(manifest_file: Path, courses: dict) -> bool:
+    """Save discovered courses so downloads can be replayed without a browser."""
+    tmp = manifest_file.with_name(manifest_file.name + ".tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
             json.dump({
-                "completed_courses": list(completed),
+                "courses": courses,
                 "last_updated": datetime.datetime.now().isoformat()
             }, f, indent=2)
+        os.replace(tmp, manifest_file)  # a crash mid-write leaves the old manifest intact
+        return True
     except Exception as e:
-        print(f"Warning: Could not save progress: {e}")
+        print(f"Warning: Could not save manifest: {e}")
+        return False
+
+
+def compact_manifest(manifest_file: Path):
+    """Fold the discovery log into the manifest file, once per run."""
+    if not manifest_log(manifest_file).exists():
+        return
+    try:
+        courses = load_manifest(manifest_file)
+    except ValueError as e:
+        print(f"Warning: {e}; discovery log left in place")
+        return
+    if save_manifest(manifest_file, courses):
+        manifest_log(manifest_file).unlink()
+
+
+class AdaptiveLimit:
+    """
+    AIMD controller for the number of downloads in flight.
+
+    Every ``window`` seconds it compares aggregate throughput with the
+    previous window: while the slots are busy and bytes/sec keeps improving
+    the limit goes up by one; any 429/503 or failed attempt halves it, and a
+    clear rise in time-to-first-byte takes one slot away.  The window after a
+    halving is ignored so errors already in flight aren't punished twice.  Changes are printed
+    as they happen and ``history`` keeps (seconds, limit, MB/s) for the
+    end-of-run report.
+    """
+
+    def __init__(self, start, ceiling, floor=1, window=ADAPT_WINDOW_SEC):
+        self.limit = max(floor, min(start, ceiling))
+        self.floor, self.ceiling, self.window = floor, ceiling, window
+        self.active = 0
+        self.cond = asyncio.Condition()
+        self.t0 = time.monotonic()
+        self.history = [(0.0, self.limit, 0.0)]
+        self._bytes = self._failures = self._throttled = 0
+        self._ttfb = []
+        self._last_rate = 0.0
+        self._ttfb_base = None
+        self._cooldown = False
+
+    async def __aenter__(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, *exc):
+        async with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def record_bytes(self, n):
+        self._bytes += n
+
+    def record_ttfb(self, seconds):
+        self._ttfb.append(seconds)
+
+    def record_failure(self, status=None):
+        if status in (429, 503):
+            self._throttled += 1
+        else:
+            self._failures += 1
+
+    async def run(self):
+        """Adjust the limit once per window until cancelled."""
+        while True:
+            await asyncio.sleep(self.window)
+            await self._adjust()
+
+    async def _adjust(self):
+        rate = self._bytes / self.window
+        ttfb = statistics.median(self._ttfb) if self._ttfb else None
+        busy = self.active >= self.limit
+        new, why = self.limit, ""
+
+        if self._cooldown:
+            # failures from requests started before the last cut don't count twice
+            self._cooldown = False
+        elif self._throttled or self._failures:
+            new = max(self.floor, self.limit // 2)
+            why = f"{self._throttled} throttled, {self._failures} failed"
+            self._cooldown = True
+        elif (ttfb and self._ttfb_base and ttfb > 1.5 * self._ttfb_base
+              and ttfb - self._ttfb_base > 0.25):
+            new = max(self.floor, self.limit - 1)
+            why = f"TTFB {ttfb * 1000:.0f} ms vs {self._ttfb_base * 1000:.0f} ms"
+        elif busy and rate > self._last_rate * 1.05:
+            new = min(self.ceiling, self.limit + 1)
+            why = "throughput improving"
+
+        if ttfb:
+            # slowly-rising baseline so one quiet window doesn't pin it forever
+            self._ttfb_base = ttfb if self._ttfb_base is None else min(ttfb, self._ttfb_base * 1.1)
+        self._last_rate = rate
+        self._bytes = self._failures = self._throttled = 0
+        self._ttfb = []
+
+        elapsed = time.monotonic() - self.t0
+        if new != self.limit:
+            print(f"\n   ⇅ concurrency {self.limit} → {new} at {rate / 1e6:.1f} MB/s ({why})")
+            async with self.cond:
+                self.limit = new
+                self.cond.notify_all()
+        self.history.append((elapsed, self.limit, rate / 1e6))
+
+    def report(self):
+        levels = [lvl for _, lvl, _ in self.history]
+        print(f"Concurrency: settled at {self.limit} "
+              f"(min {min(levels)}, max {max(levels)}, ceiling {self.ceiling})")
+        changes = [f"{t:.0f}s→{lvl}" for i, (t, lvl, _) in enumerate(self.history)
+                   if i == 0 or lvl != self.history[i - 1][1]]
+        print("  timeline: " + ", ".join(changes))
+
+
+class BandwidthCap:
+    """
+    Token bucket shared by every download, refilled at the rate the schedule
+    gives for the current time of day.
+
+    Callers take tokens after reading a chunk and sleep off any deficit, so
+    the combined speed of all streams stays under the cap however many are
+    running.  The rate is looked up again on every call (and at least once a
+    second while waiting), so a window change takes effect mid-download.
+    """
+
+    def __init__(self, schedule, clock=None):
+        self.schedule = schedule
+        self.clock = clock or datetime.datetime.now
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+        self.rate = self._current()
+        self.waited = 0.0
+        self._announce()
+
+    def _current(self):
+        now = self.clock()
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            inside = start <= minute < end if start < end else (minute >= start or minute < end)
+            if inside:
+                return rate
+        return None
+
+    def _announce(self):
+        if self.rate:
+            print(f"   ⏷ bandwidth cap {self.rate * 8 / 1e6:.1f} Mbit/s")
+        elif self.schedule:
+            print("   ⏶ bandwidth cap lifted")
+
+    def _refill(self):
+        rate = self._current()
+        if rate != self.rate:
+            self.rate, self.tokens = rate, 0.0
+            self._announce()
+        now = time.monotonic()
+        if self.rate:
+            # at most one second of burst builds up while idle
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    async def consume(self, n):
+        self._refill()
+        if not self.rate:
+            return
+        self.tokens -= n
+        while self.tokens < 0 and self.rate:
+            pause = min(1.0, -self.tokens / self.rate)
+            self.waited += pause
+            await asyncio.sleep(pause)
+            self._refill()
+
+    def report(self):
+        if self.schedule:
+            print(f"Bandwidth: downloads paused {self.waited:.0f}s in total under the cap")
+
+
+def make_session(stats: dict, limit=MAX_CONCURRENCY):
+    """
+    One pooled aiohttp session for the whole run.
+
+    The connector caps total and per-host connections at the download ceiling,
+    keeps idle connections alive for reuse and caches DNS.  Connection and
+    DNS events are counted into ``stats`` for the end-of-run summary.
+    """
+    for key in ("requests", "new_conns", "reused_conns", "dns_hits", "dns_misses"):
+        stats.setdefault(key, 0)
+
+    def counter(key):
+        async def bump(session, ctx, params):
+            stats[key] += 1
+        return bump
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(counter("requests"))
+    trace.on_connection_create_end.append(counter("new_conns"))
+    trace.on_connection_reuseconn.append(counter("reused_conns"))
+    trace.on_dns_cache_hit.append(counter("dns_hits"))
+    trace.on_dns_cache_miss.append(counter("dns_misses"))
+
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=min(CONN_PER_HOST, limit),
+        keepalive_timeout=KEEPALIVE_SEC,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_SEC,
+    )
+    # Create session with custom user-agent
+    return aiohttp.ClientSession(
+        headers={"User-Agent": USER_AGENT},
+        connector=connector,
+        trace_configs=[trace],
+    )
+
+
+def print_connection_stats(stats: dict):
+    conns = stats["new_conns"] + stats["reused_conns"]
+    reuse = 100 * stats["reused_conns"] / conns if conns else 0
+    print(f"HTTP: {stats['requests']} requests over {stats['new_conns']} new "
+          f"connections, {stats['reused_conns']} reused ({reuse:.0f}% reuse); "
+          f"DNS cache {stats['dns_hits']} hits / {stats['dns_misses']} misses")
+
+
+class Journal:
+    """
+    WAL-mode SQLite journal shared by every snapshot in the output dir.
+
+    ``tracks`` gets one row per track as soon as it finishes (or fails), so a
+    crash only loses the tracks that were in flight.  ``courses`` replaces the
+    old course-level progress JSON, and ``remote`` keeps the validators used
+    for conditional requests.  The CSV indexes are exported from here.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS tracks (
+        snapshot      TEXT NOT NULL,
+        slug          TEXT NOT NULL,
+        source_url    TEXT NOT NULL,
+        file          TEXT,
+        orig_filename TEXT,
+        dest          TEXT,
+        bytes         INTEGER,
+        sha256        TEXT,
+        status        TEXT NOT NULL,
+        updated_at    TEXT NOT NULL,
+        PRIMARY KEY (snapshot, slug, source_url)
+    );
+    CREATE TABLE IF NOT EXISTS courses (
+        slug       TEXT PRIMARY KEY,
+        title      TEXT,
+        status     TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS remote (
+        url_key        TEXT PRIMARY KEY,
+        etag           TEXT,
+        last_modified  TEXT,
+        content_length INTEGER,
+        sha256         TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, db_file: Path):
+        self.db = sqlite3.connect(db_file)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # ── courses ──
+    def has_courses(self) -> bool:
+        return self.db.execute("SELECT 1 FROM courses LIMIT 1").fetchone() is not None
+
+    def completed_courses(self, manifest=None) -> set:
+        """
+        Courses marked done whose every known track has finished.
+
+        Known tracks are the course's rows here plus, when given, the
+        manifest's track list.  A track with no 'done' row in any snapshot
+        (it failed, or was never attempted) puts its course back in the queue.
+        """
+        marked = {slug for (slug,) in self.db.execute(
+            "SELECT slug FROM courses WHERE status = 'done'")}
+        finished = {}
+        for slug, url in self.db.execute(
+                "SELECT DISTINCT slug, source_url FROM tracks WHERE status = 'done'"):
+            finished.setdefault(slug, set()).add(url)
+        unfinished = {slug for slug, url in self.db.execute(
+            "SELECT DISTINCT slug, source_url FROM tracks WHERE status != 'done'")
+            if url not in finished.get(slug, ())}
+        for slug, entry in (manifest or {}).items():
+            if slug in marked and not set(entry.get("tracks", [])) <= finished.get(slug, set()):
+                unfinished.add(slug)
+        return marked - unfinished
+
+    def mark_course(self, slug, title, status="done"):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO courses VALUES (?, ?, ?, ?)",
+                (slug, title, status, datetime.datetime.now().isoformat()))
+
+    # ── tracks ──
+    def finished_track(self, snapshot, slug, url):
+        """(file, sha256) of a track already done in this snapshot, else None."""
+        return self.db.execute(
+            "SELECT file, sha256 FROM tracks WHERE snapshot = ? AND slug = ? "
+            "AND source_url = ? AND status = 'done'",
+            (snapshot, slug, url)).fetchone()
+
+    def record_track(self, snapshot, slug, url, status, file=None,
+                     orig_filename=None, dest=None, size=None, digest=None):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (snapshot, slug, url, file, orig_filename,
+                 str(dest) if dest else None, size, digest, status,
+                 datetime.datetime.now().isoformat()))
+
+    # ── remote validators ──
+    def remote_get(self, key):
+        row = self.db.execute(
+            "SELECT etag, last_modified, content_length, sha256 FROM remote "
+            "WHERE url_key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        return dict(zip(("etag", "last_modified", "content_length", "sha256"), row))
+
+    def remote_put(self, key, meta):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO remote VALUES (?, ?, ?, ?, ?)",
+                (key, meta.get("etag"), meta.get("last_modified"),
+                 meta.get("content_length"), meta["sha256"]))
+
+    # ── exports ──
+    def export_course(self, snapshot, slug, dest: Path):
+        """Atomically rewrite index.csv and checksums.sha256 for one course."""
+        rows = self.db.execute(
+            "SELECT file, orig_filename, source_url, sha256 FROM tracks "
+            "WHERE snapshot = ? AND slug = ? AND status = 'done' ORDER BY file",
+            (snapshot, slug))
+        index_tmp = dest / "index.csv.tmp"
+        sums_tmp = dest / "checksums.sha256.tmp"
+        with open(index_tmp, "w", newline="", encoding="utf-8") as f, \
+                open(sums_tmp, "w") as c:
+            w = csv.writer(f)
+            w.writerow(INDEX_HEADER)
+            for name, orig, url, digest in rows:
+                w.writerow([name, orig, url])
+                c.write(f"{digest}  {name}\n")
+        os.replace(index_tmp, dest / "index.csv")
+        os.replace(sums_tmp, dest / "checksums.sha256")
+
+    def export_global(self, snapshot, out_file: Path) -> int:
+        """Atomically rewrite global_index.csv for a snapshot; returns the row count."""
+        rows = self.db.execute(
+            "SELECT slug, file, orig_filename, source_url FROM tracks "
+            "WHERE snapshot = ? AND status = 'done' ORDER BY slug, file",
+            (snapshot,))
+        count = 0
+        tmp = out_file.with_name(out_file.name + ".tmp")
+        with open(tmp, "w", newline="", encoding="utf-8") as g:
+            w = csv.writer(g)
+            w.writerow(GLOBAL_INDEX_HEADER)
+            for row in rows:
+                w.writerow(row)
+                count += 1
+        os.replace(tmp, out_file)
+        return count
+
+
+class IndexWriter:
+    """
+    Append-only CSV, flushed after every row.
+
+    A crash or Ctrl-C part way through a run still leaves a usable (unsorted,
+    possibly duplicated) index on disk; the journal export later replaces it
+    with the sorted, de-duplicated version.
+    """
+
+    def __init__(self, path: Path, header):
+        fresh = not path.exists() or path.stat().st_size == 0
+        self.f = open(path, "a", newline="", encoding="utf-8")
+        self.w = csv.writer(self.f)
+        if fresh:
+            self.write(header)
+
+    def write(self, row):
+        self.w.writerow(row)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+# ─────────────────────────────────────────────────────────────────────
+
+
+# ─── verification ───────────────────────────────────────────────────
+NOT_TRACKS = {"index.csv", "checksums.sha256"}
+
+
+def hash_file_fast(path: str):
+    """sha256 of a whole file via mmap (buffered 8 MiB reads as fallback)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                h.update(m)
+        except (ValueError, OSError):  # empty file / no mmap support
+            for chunk in iter(lambda: f.read(8 << 20), b""):
+                h.update(chunk)
+    return path, h.hexdigest()
+
+
+def read_checksums(sums_file: Path) -> dict:
+    expected = {}
+    with open(sums_file, "r", encoding="utf-8") as f:
+        for line in f:
+            digest, _, name = line.rstrip("\r\n").partition("  ")
+            if name:
+                expected[name] = digest
+    return expected
+
+
+def verify_tree(root: Path, workers=VERIFY_WORKERS) -> int:
+    """
+    Check every course folder under ``root`` against its checksums.sha256.
+
+    Files are hashed in a process pool; hardlinked copies of one blob (the
+    object store makes many) are only hashed once.  Reports mismatches,
+    missing and orphan files plus throughput; returns a process exit code.
+    A missing ``root``, or one without any checksums.sha256, is an error
+    rather than a vacuous pass.
+    """
+    if not root.is_dir():
+        print(f"Error: {root} is not a directory")
+        return 1
+    sums_files = sorted(root.rglob("checksums.sha256"))
+    if not sums_files:
+        print(f"Error: no course folders (checksums.sha256) under {root}")
+        return 1
+
+    started = time.monotonic()
+    expected = {}     # path -> digest
+    missing, orphans = [], []
+    # course folders that hold tracks but no checksums can't be verified
+    unlisted = sorted({p.parent for p in root.rglob("*.mp3")} - {f.parent for f in sums_files})
+    for sums_file in sums_files:
+        course = sums_file.parent
+        listed = read_checksums(sums_file)
+        for name, digest in listed.items():
+            path = course / name
+            if path.exists():
+                expected[str(path)] = digest
+            else:
+                missing.append(path)
+        for path in sorted(course.iterdir()):
+            if path.is_file() and path.name not in listed and path.name not in NOT_TRACKS:
+                orphans.append(path)
+
+    # one hash per inode; snapshots share blobs via hardlinks
+    by_inode = {}
+    for path in expected:
+        st = os.stat(path)
+        by_inode.setdefault((st.st_dev, st.st_ino), (path, st.st_size))
+    total_bytes = sum(size for _, size in by_inode.values())
+    print(f"Verifying {len(expected)} files ({len(by_inode)} unique, "
+          f"{total_bytes / 1e6:.0f} MB) with {workers} processes …")
+
+    actual = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(hash_file_fast, path): key
+                   for key, (path, _) in by_inode.items()}
+        for fut in tqdm(as_completed(futures), total=len(futures), unit="file"):
+            actual[futures[fut]] = fut.result()[1]
+
+    mismatches = []
+    for path, digest in expected.items():
+        st = os.stat(path)
+        if actual[(st.st_dev, st.st_ino)] != digest:
+            mismatches.append(path)
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    for path in mismatches:
+        print(f"MISMATCH  {path}")
+    for path in missing:
+        print(f"MISSING   {path}")
+    for path in orphans:
+        print(f"ORPHAN    {path}")
+    for course in unlisted:
+        print(f"NO SUMS   {course}")
+    print(f"\n{len(expected) - len(mismatches)} ok, {len(mismatches)} mismatched, "
+          f"{len(missing)} missing, {len(orphans)} orphan files, "
+          f"{len(unlisted)} folders without checksums; "
+          f"{total_bytes / 1e6 / elapsed:.1f} MB/s over {elapsed:.1f}s")
+    return 1 if mismatches or missing or unlisted else 0
 # ─────────────────────────────────────────────────────────────────────
 
 
@@ -165,33 +1081,65 @@ async def click_login(page):
 
 
 async def login(page, email, pwd):
-    await page.goto("https://app.mysoundwise.com/signin", timeout=0)
+    await page.goto(f"{APP_URL}/signin", timeout=0)
     await page.fill('input[type="email"]', email)
     await page.fill('input[type="password"]', pwd)
     await click_login(page)
     await page.wait_for_url("**/mysoundcasts**", timeout=45_000)
 
 
+async def session_is_valid(page) -> bool:
+    """Cheap probe: does the saved session land on the card list, not sign-in?"""
+    try:
+        await page.goto(f"{APP_URL}/mysoundcasts", timeout=30_000)
+        # whichever shows first: a card (logged in) or the password box
+        await page.wait_for_selector(f'{CARD_SELECTOR}, input[type="password"]',
+                                     state="visible", timeout=15_000)
+        return "/signin" not in page.url and await page.locator(CARD_SELECTOR).count() > 0
+    except TimeoutError:
+        return False
+
+
+def save_session_state(state: dict, state_file: Path):
+    """Write the browser storage state readable by the owner only."""
+    fd = os.open(state_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.chmod(state_file, 0o600)
+
+
+async def ensure_logged_in(context, page, email, pwd, state_file: Path, reuse=True):
+    """Reuse the saved session if it still works, else sign in and save it."""
+    if reuse and state_file.exists() and await session_is_valid(page):
+        print("Reusing saved login session")
+        return
+    await login(page, email, pwd)
+    save_session_state(await context.storage_state(), state_file)
+
+
 async def list_soundcast_cards(page):
     """Wait up to 60 s for cards, then return them."""
-    await page.wait_for_selector('a[href*="/mysoundcasts/"] label',
+    await page.wait_for_selector(CARD_SELECTOR,
                                  state="visible",
                                  timeout=60_000)
     cards = page.locator('a[href*="/mysoundcasts/"]')
     return cards, await cards.count()
 
 
-async def trigger_all_plays(page, audio_links):
+async def trigger_all_plays(page, add_link, tag=""):
     """
-    Click every play icon. After each click wait until the first media response
-    (resource_type == "media") or 6 s, then pause.
+    Click every play icon. After each click wait until the first media request
+    (resource_type == "media") or 6 s, then pause.  Each URL is handed to
+    ``add_link`` as soon as it is seen so it can start downloading.  Requests
+    rather than responses are awaited so this also works when the lean
+    profile aborts the media body.
     """
     for sel in PLAY_SELECTORS:
         buttons = page.locator(sel)
         if await buttons.count():
             break
     else:
-        print("   – no play buttons found; skipping.")
+        print(f"{tag}   – no play buttons found; skipping.")
         return
 
     total = await buttons.count()
@@ -201,16 +1149,16 @@ async def trigger_all_plays(page, audio_links):
         await btn.scroll_into_view_if_needed()
 
         # wait for the audio request
-        async with page.expect_response(
-            lambda r: r.request.resource_type == "media",
+        async with page.expect_request(
+            lambda r: r.resource_type == "media",
             timeout=6_000
-        ) as resp_info:
+        ) as req_info:
             await btn.click()
 
         # store url
         try:
-            resp = await resp_info.value
-            audio_links.setdefault(resp.url, None)
+            req = await req_info.value
+            add_link(req.url)
         except TimeoutError:
             pass  # pdf-only or slow track
 
@@ -221,117 +1169,628 @@ async def trigger_all_plays(page, audio_links):
             pass
 
 
-async def backup_one_title(page, slug, global_rows, root_dir):
-    audio_links = {}
+class CourseJob:
+    """
+    One course moving through the download pipeline.
 
-    page.on("response",
-            lambda r: audio_links.setdefault(r.url, None)
-            if r.request.resource_type == "media" else None)
+    Discovery feeds URLs in with ``add``; download workers report back with
+    ``add_row`` and ``item_done``.  Rows are appended to the course's
+    index.csv and the run's global index as they complete, and failed
+    tracks are counted in ``failed_tracks``.  Once discovery has finished
+    and the last queued item has drained, ``on_finish`` is called to
+    finalize the course's index files.
 
-    await trigger_all_plays(page, audio_links)
+    Items go onto a priority queue as ``(rank, seq, job, url)``: lower
+    ``rank`` courses are downloaded first, ``seq`` keeps discovery order
+    within a rank.
+    """
 
-    if not audio_links:
-        print("   – 0 tracks (maybe PDFs-only).")
-        return
+    _seq = itertools.count()
 
-    dest = root_dir / slug
-    dest.mkdir(parents=True, exist_ok=True)
-    print(f"   – {len(audio_links)} tracks")
+    def __init__(self, slug, title, dest, queue, on_finish, bar, global_index, rank=()):
+        self.slug = slug
+        self.title = title
+        self.dest = dest
+        self.queue = queue
+        self.on_finish = on_finish
+        self.bar = bar
+        self.global_index = global_index
+        self.rank = rank
+        self.index = None
+        self.urls = {}
+        self.pending = 0
+        self.discovering = True
+        self.failed = False
+        self.failed_tracks = 0
 
-    sem, rows = asyncio.Semaphore(CONCURRENCY), []
+    def add(self, url):
+        if url in self.urls:
+            return
+        self.urls[url] = None
+        self.pending += 1
+        self.bar.total += 1
+        self.bar.refresh()
+        self.queue.put_nowait((self.rank, next(self._seq), self, url))
 
-    # Create session with custom user-agent
-    headers = {"User-Agent": USER_AGENT}
-    async with aiohttp.ClientSession(headers=headers) as sess:
-        async def grab(u):
-            async with sem:
+    def discovery_done(self, failed=False):
+        self.discovering = False
+        self.failed = failed
+        self._maybe_finish()
+
+    def add_row(self, row):
+        if self.index is None:
+            self.index = IndexWriter(self.dest / "index.csv", INDEX_HEADER)
+        self.index.write(row)
+        self.global_index.write([self.slug, *row])
+
+    def item_done(self, failed=False):
+        self.failed_tracks += failed
+        self.pending -= 1
+        self._maybe_finish()
+
+    def _maybe_finish(self):
+        if not self.discovering and self.pending == 0:
+            if self.index:
+                self.index.close()
+                self.index = None
+            try:
+                self.on_finish(self)
+            except Exception as e:
+                # A failed export must not take the worker (and queue.join) down.
+                print(f"   – Error finishing {self.title}: {e}")
+
+
+class ObjectStore:
+    """
+    Content-addressed blobs under ``objects/<aa>/<sha256>``.
+
+    Dated snapshot directories only hold hardlinks to these blobs, so a track
+    that did not change between nightly runs takes no extra disk space.
+    Filesystems without hardlinks fall back to a plain copy.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def has(self, digest) -> bool:
+        return bool(digest) and self.path(digest).exists()
+
+    def adopt(self, src: Path, digest: str):
+        """Move a freshly downloaded file into the store and link it back."""
+        blob = self.path(digest)
+        if blob.exists():
+            src.unlink()
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, blob)
+        self.link(digest, src)
+
+    def link(self, digest: str, dest: Path):
+        """Place the blob for ``digest`` at ``dest``."""
+        if dest.exists():
+            dest.unlink()
+        try:
+            os.link(self.path(digest), dest)
+        except OSError:
+            shutil.copy2(self.path(digest), dest)
+
+
+async def download_worker(queue, sess, bar, store, journal, snapshot, limiter,
+                          bandwidth=None, resume=False):
+    """
+    Drain course items from the shared queue, best rank first, for the whole run.
+
+    A worker takes a ``limiter`` slot before it dequeues and keeps it for the
+    item, so items only leave the queue when they can start right away and
+    the best-ranked ones are not parked behind a full limiter.
+    """
+    while True:
+        async with limiter:
+            _, _, job, u = await queue.get()
+            failed = True
+            try:
                 stem = u.split("/")[-1].split("?")[0]
                 safe = slugify(stem.rsplit(".", 1)[0], max_length=60) + ".mp3"
-                success = await fetch_with_retry(sess, u, dest / safe)
-                if success:
-                    rows.append([safe, stem, u])
-        await tqdm.gather(*[grab(u) for u in audio_links])
+                target = job.dest / safe
+                job.dest.mkdir(parents=True, exist_ok=True)
+
+                done = journal.finished_track(snapshot, job.slug, u) if resume else None
+                if done and (job.dest / done[0]).exists():
+                    failed = False
+                    continue  # finished before the crash/restart
 
-    with open(dest / "index.csv", "w", newline="", encoding="utf-8") as f:
-        csv.writer(f).writerows([["file", "orig_filename", "source_url"], *rows])
+                known = journal.remote_get(url_key(u))
+                if known and not store.has(known["sha256"]):
+                    known = None  # blob was pruned; fetch unconditionally
+                meta = {}
+                digest = await fetch_with_retry(sess, u, target, resume=resume,
+                                                known=known, meta=meta, limiter=limiter,
+                                                bandwidth=bandwidth)
+                if digest:
+                    if meta.get("unchanged"):
+                        store.link(digest, target)
+                    else:
+                        store.adopt(target, digest)
+                        journal.remote_put(url_key(u), {**meta, "sha256": digest})
+                    journal.record_track(snapshot, job.slug, u, "done", safe, stem,
+                                         target, target.stat().st_size, digest)
+                    job.add_row([safe, stem, u])
+                    failed = False
+                else:
+                    journal.record_track(snapshot, job.slug, u, "failed", safe, stem)
+            except Exception as e:
+                print(f"   – Error downloading {u}: {e}")
+                journal.record_track(snapshot, job.slug, u, "failed")
+            finally:
+                bar.update(1)
+                queue.task_done()
+                job.item_done(failed)
 
-    with open(dest / "checksums.sha256", "w") as f:
-        for name, *_ in rows:
-            f.write(f"{sha256sum(dest / name)}  {name}\n")
 
-    for r in rows:
-        global_rows.append([slug, *r])
+async def harvest_audio_urls(page, responses, add_link):
+    """
+    Pull track URLs out of the app's JSON/XHR responses captured during page
+    load, plus anything embedded in the rendered page.  Returns the count.
+    """
+    found = 0
+    for r in responses:
+        try:
+            body = await r.text()
+        except Exception:
+            continue  # redirected / body already gone
+        for url in find_audio_urls(body):
+            add_link(url)
+            found += 1
 
+    try:
+        html = await page.content()
+    except Exception:
+        html = ""
+    for url in find_audio_urls(html):
+        add_link(url)
+        found += 1
+    return found
 
-async def main(email, pwd, resume=False, headless=False, output_dir=None):
-    # Setup output directory
-    root_dir = Path(output_dir) / datetime.date.today().isoformat() if output_dir else ROOT_DIR
-    root_dir.mkdir(parents=True, exist_ok=True)
 
-    progress_file = root_dir.parent / ".soundwise_progress.json"
-    completed_courses = load_progress(progress_file) if resume else set()
+async def backup_one_title(page, job, url, discovery=DISCOVERY, tag=""):
+    """
+    Discover a course's tracks; downloads start as each URL is found.
+    Returns the seconds it took the course page to show its first play icon.
+    """
+    data_responses = []
+    add_link = job.add
 
-    if resume and completed_courses:
-        print(f"Resuming: {len(completed_courses)} courses already completed")
+    def on_request(r):
+        # media URLs are taken from the request, its body may be aborted
+        if r.resource_type == "media":
+            add_link(r.url)
+
+    def on_response(r):
+        if r.request.resource_type in ("xhr", "fetch"):
+            data_responses.append(r)
 
-    global_rows = []
+    # listen before navigating so the app's first data requests are caught;
+    # pages are reused across courses, so drop the listeners when done
+    page.on("request", on_request)
+    page.on("response", on_response)
+    try:
+        started = time.monotonic()
+        await page.goto(url)
+        # wait for a play icon instead of network-idle
+        await page.wait_for_selector('div.track-pause-play', timeout=60_000)
+        load_sec = time.monotonic() - started
+
+        harvested = 0
+        if discovery == "harvest":
+            try:
+                await page.wait_for_load_state("networkidle", timeout=5_000)
+            except TimeoutError:
+                pass  # chatty page; use whatever has arrived
+            harvested = await harvest_audio_urls(page, data_responses, add_link)
+            if harvested:
+                print(f"{tag}   – harvested {len(job.urls)} track URLs from page data")
+            else:
+                print(f"{tag}   – nothing in page data; clicking play buttons")
 
+        if not harvested:
+            await trigger_all_plays(page, add_link, tag)
+    finally:
+        page.remove_listener("request", on_request)
+        page.remove_listener("response", on_response)
+
+    if not job.urls:
+        print(f"{tag}   – 0 tracks (maybe PDFs-only).")
+    else:
+        print(f"{tag}   – {len(job.urls)} tracks queued")
+    return load_sec
+
+
+async def collect_cards(page):
+    """Read (title, slug, url) for every soundcast card on the list page."""
+    cards, total = await list_soundcast_cards(page)
+    found = []
+    for i in range(total):
+        card = cards.nth(i)
+        full_text = (await card.inner_text()).strip()
+        title = full_text.splitlines()[0]  # drop "Current access…"
+        href = await card.get_attribute("href")
+        found.append((title, slugify(title, max_length=80), urljoin(page.url, href)))
+    return found
+
+
+async def page_worker(wid, page, queue, total, start_course, on_discovered,
+                      discovery, load_times):
+    """Take cards off the shared queue and discover each one on this page."""
+    tag = f"[w{wid}]"
+    while True:
+        try:
+            i, title, slug, url = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+
+        print(f"\n{tag} [{i+1}/{total}]  {title}")
+        job = start_course(slug, title)
+        try:
+            load_times.append(await backup_one_title(page, job, url, discovery, tag))
+            on_discovered(job)
+            job.discovery_done()
+        except Exception as e:
+            print(f"{tag}   – Error: {e}")
+            job.discovery_done(failed=True)
+        print(f"{tag} discovered {i+1}/{total}  ({queue.qsize()} cards left in queue)")
+
+
+async def lean_route(route):
+    """Abort requests discovery doesn't need; media URLs are still observed."""
+    req = route.request
+    host = urlparse(req.url).hostname or ""
+    if (req.resource_type in BLOCKED_RESOURCE_TYPES
+            or any(host == t or host.endswith("." + t) for t in TRACKER_HOSTS)):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+def print_load_report(load_times, lean):
+    if not load_times:
+        return
+    ordered = sorted(load_times)
+    p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+    profile = "lean" if lean else "full"
+    print(f"Page loads ({profile} profile, {len(ordered)} cards): "
+          f"mean {statistics.mean(ordered):.2f}s, median {statistics.median(ordered):.2f}s, "
+          f"p90 {p90:.2f}s, total {sum(ordered):.0f}s")
+
+
+async def discover_library(email, pwd, headless, page_workers, discovery,
+                           completed_courses, start_course, on_discovered,
+                           state_file, lean=LEAN_PAGES, debug=DEBUG, fresh_login=False):
+    """Log in, list every soundcast and feed their tracks into the pipeline."""
+    load_times = []
     async with async_playwright() as p:
         browser = await p.chromium.launch(
             headless=headless,
-            slow_mo=50 if not headless else 0
+            slow_mo=50 if debug else 0
         )
-        context = await browser.new_context(user_agent=USER_AGENT)
+        # one context => every page shares the login cookies
+        reuse = not fresh_login and state_file.exists()
+        try:
+            context = await browser.new_context(
+                user_agent=USER_AGENT,
+                storage_state=str(state_file) if reuse else None)
+        except Exception as e:
+            print(f"Warning: Could not load saved session: {e}")
+            reuse = False
+            context = await browser.new_context(user_agent=USER_AGENT)
+        if lean:
+            await context.route("**/*", lean_route)
         page = await context.new_page()
 
-        await login(page, email, pwd)
-        cards, total = await list_soundcast_cards(page)
+        await ensure_logged_in(context, page, email, pwd, state_file, reuse)
+        cards = await collect_cards(page)
+        total = len(cards)
         print(f"Found {total} sound-casts")
 
-        for i in range(total):
-            card = cards.nth(i)
-            full_text = (await card.inner_text()).strip()
-            title = full_text.splitlines()[0]  # drop "Current access…"
-            slug = slugify(title, max_length=80)
-
+        queue = asyncio.Queue()
+        for i, (title, slug, url) in enumerate(cards):
             # Skip if already completed (resume mode)
             if slug in completed_courses:
                 print(f"\n[SKIP] {i+1}/{total}  {title} (already downloaded)")
                 continue
+            queue.put_nowait((i, title, slug, url))
 
-            print(f"\n[{i+1}/{total}]  {title}")
-            await card.scroll_into_view_if_needed()
-            await card.click()
+        n_workers = max(1, min(page_workers, queue.qsize()))
+        pages = [page] + [await context.new_page() for _ in range(n_workers - 1)]
+        if n_workers > 1:
+            print(f"Using {n_workers} page workers")
 
-            # wait for a play icon instead of network-idle
-            await page.wait_for_selector('div.track-pause-play', timeout=60_000)
+        await asyncio.gather(*[
+            page_worker(w + 1, pg, queue, total, start_course, on_discovered,
+                        discovery, load_times)
+            for w, pg in enumerate(pages)
+        ])
 
-            try:
-                await backup_one_title(page, slug, global_rows, root_dir)
-                # Mark as completed
-                completed_courses.add(slug)
-                save_progress(progress_file, completed_courses)
-            except Exception as e:
-                print(f"   – Error: {e}")
+        # keep any refreshed tokens for the next run
+        save_session_state(await context.storage_state(), state_file)
+        await browser.close()
+    print_load_report(load_times, lean)
 
-            await page.go_back()
-            await page.wait_for_selector('a[href*="/mysoundcasts/"] label',
-                                         timeout=60_000)
 
-        await browser.close()
+# ─── size estimation ────────────────────────────────────────────────
+async def probe_size(sess, url):
+    """Remote size from HEAD, or from a zero-length Range GET if HEAD won't say."""
+    try:
+        async with sess.head(url, allow_redirects=True) as r:
+            if r.status < 400 and r.content_length:
+                return r.content_length
+    except aiohttp.ClientError:
+        pass
+    async with sess.get(url, headers={"Range": "bytes=0-0"}) as r:
+        if r.status == 206:
+            return parse_content_range(r.headers.get("Content-Range"))[1]
+        if r.status < 400:
+            return r.content_length  # Range ignored; body is never read
+    return None
+
+
+async def size_worker(queue, sess, bar, sizes, largest):
+    """Like download_worker, but only asks each track for its size."""
+    while True:
+        _, _, job, u = await queue.get()
+        try:
+            size = await probe_size(sess, u)
+        except Exception:
+            size = None
+        finally:
+            entry = sizes.setdefault(job.slug, {"title": job.title, "tracks": 0,
+                                                "bytes": 0, "unknown": 0})
+            entry["tracks"] += 1
+            if size:
+                entry["bytes"] += size
+                largest.append((size, u))
+            else:
+                entry["unknown"] += 1
+            bar.update(1)
+            queue.task_done()
+            job.item_done()
+
+
+async def measure_throughput(sess, urls, streams=CONCURRENCY, seconds=PROBE_SEC):
+    """Download from the given URLs in parallel for a few seconds; bytes/sec."""
+    received = 0
+    deadline = time.monotonic() + seconds
+
+    async def pull(url):
+        nonlocal received
+        async with sess.get(url) as r:
+            r.raise_for_status()
+            async for chunk in r.content.iter_chunked(1 << 16):
+                received += len(chunk)
+                if time.monotonic() >= deadline:
+                    return
+
+    started = time.monotonic()
+    await asyncio.gather(*[pull(u) for u in urls[:streams]], return_exceptions=True)
+    return received / max(time.monotonic() - started, 1e-6)
+
+
+def print_estimate(sizes, rate, report_file: Path):
+    """Per-course and library totals; flag the few courses holding half the bytes."""
+    total = sum(e["bytes"] for e in sizes.values())
+    unknown = sum(e["unknown"] for e in sizes.values())
+    ranked = sorted(sizes.items(), key=lambda kv: kv[1]["bytes"], reverse=True)
+
+    dominant, running = set(), 0
+    for slug, e in ranked:
+        if running >= total / 2:
+            break
+        dominant.add(slug)
+        running += e["bytes"]
+
+    with open(report_file, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["title_slug", "title", "tracks", "bytes", "unknown_size", "share"])
+        for slug, e in ranked:
+            share = e["bytes"] / total if total else 0
+            w.writerow([slug, e["title"], e["tracks"], e["bytes"], e["unknown"], f"{share:.4f}"])
+
+    print("\nLargest courses:")
+    for slug, e in ranked[:15]:
+        share = 100 * e["bytes"] / total if total else 0
+        flag = "  ◀ dominant" if slug in dominant else ""
+        print(f"  {e['bytes'] / 1e9:8.2f} GB  {share:5.1f}%  {e['tracks']:4d} tracks  {slug}{flag}")
+    print(f"\nLibrary: {len(sizes)} courses, {sum(e['tracks'] for e in sizes.values())} "
+          f"tracks, {total / 1e9:.2f} GB ({unknown} tracks of unknown size)")
+    print(f"{len(dominant)} course(s) hold half of the bytes")
+    if rate:
+        eta = datetime.timedelta(seconds=round(total / rate))
+        print(f"Probe throughput {rate / 1e6:.1f} MB/s → about {eta} (h:mm:ss) for a full backup")
+    print(f"Per-course sizes written to {report_file}")
+# ─────────────────────────────────────────────────────────────────────
 
-    if global_rows:
-        with open(root_dir / "global_index.csv", "w", newline="", encoding="utf-8") as g:
-            csv.writer(g).writerows(
-                [["title_slug", "file", "orig_filename", "source_url"], *global_rows]
-            )
+
+def replay_manifest(manifest, completed_courses, start_course):
+    """Queue every track recorded in the manifest; no browser involved."""
+    total = len(manifest)
+    print(f"Replaying {total} sound-casts from manifest")
+    for i, (slug, entry) in enumerate(manifest.items()):
+        title = entry.get("title") or slug
+        if slug in completed_courses:
+            print(f"[SKIP] {i+1}/{total}  {title} (already downloaded)")
+            continue
+        job = start_course(slug, title)
+        for url in entry.get("tracks", []):
+            job.add(url)
+        print(f"[{i+1}/{total}]  {title} – {len(job.urls)} tracks queued")
+        job.discovery_done()
+
+
+async def estimate_library(discover, workers, report_file: Path):
+    """Discovery-only run: size every track, probe throughput, print a plan."""
+    sizes, largest = {}, []
+    queue = asyncio.PriorityQueue()
+    http_stats = {}
+    async with make_session(http_stats, workers) as sess:
+        bar = tqdm(total=0, unit="track", desc="sizing")
+
+        def start_course(slug, title):
+            return CourseJob(slug, title, None, queue, lambda job: None, bar, None)
+
+        tasks = [asyncio.create_task(size_worker(queue, sess, bar, sizes, largest))
+                 for _ in range(workers)]
+        await discover(start_course, set())
+        await queue.join()
+        for t in tasks:
+            t.cancel()
+        bar.close()
+
+        largest.sort(reverse=True)
+        rate = 0
+        if largest:
+            print(f"\nProbing throughput for {PROBE_SEC:.0f}s …")
+            rate = await measure_throughput(sess, [u for _, u in largest])
+    print_estimate(sizes, rate, report_file)
+
+
+async def main(email, pwd, resume=False, headless=False, output_dir=None,
+               page_workers=PAGE_WORKERS, discovery=DISCOVERY, from_manifest=None,
+               max_concurrency=MAX_CONCURRENCY, lean_pages=LEAN_PAGES, debug=DEBUG,
+               fresh_login=False, estimate=False, bandwidth=BANDWIDTH, order=ORDER,
+               pinned=PINNED):
+    # Setup output directory
+    root_dir = Path(output_dir) / datetime.date.today().isoformat() if output_dir else ROOT_DIR
+    root_dir.parent.mkdir(parents=True, exist_ok=True)
+
+    journal = Journal(root_dir.parent / ".soundwise_journal.db")
+    snapshot = root_dir.name
+
+    # carry over course-level progress from the old JSON file
+    progress_file = root_dir.parent / ".soundwise_progress.json"
+    if not journal.has_courses():
+        for slug in load_progress(progress_file):
+            journal.mark_course(slug, None)
+
+    manifest_file = root_dir.parent / ".soundwise_manifest.json"
+    if from_manifest:
+        manifest_file = Path(from_manifest)
+    try:
+        manifest = load_manifest(manifest_file)
+    except ValueError as e:
+        journal.close()
+        print(f"Error: {e}")
+        print("Fix or remove it; it is not overwritten while it can't be read.")
+        sys.exit(1)
+
+    # a course is only skipped if none of its tracks failed or went missing
+    completed_courses = journal.completed_courses(manifest) if resume else set()
+
+    def record_discovery(job):
+        # appended, not rewritten: one line per course however large the library
+        append_manifest(manifest_file, job.slug, {
+            "title": job.title,
+            "tracks": list(job.urls),
+            "discovered_at": datetime.datetime.now().isoformat(),
+        })
+
+    async def discover(start_course, skip):
+        if from_manifest is not None:
+            if not manifest:
+                print(f"No courses recorded in {manifest_file}")
+            replay_manifest(manifest, skip, start_course)
+        else:
+            await discover_library(email, pwd, headless, page_workers, discovery,
+                                   skip, start_course, record_discovery,
+                                   root_dir.parent / ".soundwise_session.json",
+                                   lean=lean_pages, debug=debug, fresh_login=fresh_login)
+
+    if estimate:
+        journal.close()
+        try:
+            await estimate_library(discover, max_concurrency, root_dir.parent / "size_estimate.csv")
+        finally:
+            compact_manifest(manifest_file)
+        return
+
+    root_dir.mkdir(parents=True, exist_ok=True)
+    store = ObjectStore(root_dir.parent / "objects")
+
+    if resume and completed_courses:
+        print(f"Resuming: {len(completed_courses)} courses already completed")
+
+    downloads = asyncio.PriorityQueue()
+
+    def size_hint(slug):
+        """Bytes last seen for a course's tracks, from the manifest and journal."""
+        tracks = manifest.get(slug, {}).get("tracks", [])
+        sizes = [(journal.remote_get(url_key(u)) or {}).get("content_length") for u in tracks]
+        known = [n for n in sizes if n]
+        if not known:
+            return float("inf")  # never downloaded: after the courses we can size
+        return sum(known) / len(known) * len(tracks)
+
+    def course_rank(slug, title):
+        pin = next((i for i, pat in enumerate(pinned)
+                    if fnmatch.fnmatch(slug, pat) or fnmatch.fnmatch(slugify(title), pat)),
+                   len(pinned))
+        return (pin, size_hint(slug) if order == "smallest" else 0)
+
+    def finish_course(job):
+        if job.urls:
+            journal.export_course(snapshot, job.slug, job.dest)
+        if job.failed_tracks:
+            # left for --resume, which skips the tracks that did finish
+            print(f"   – {job.title}: {job.failed_tracks} of {len(job.urls)} tracks failed")
+            journal.mark_course(job.slug, job.title, "incomplete")
+        elif not job.failed:
+            # Mark as completed
+            journal.mark_course(job.slug, job.title)
+
+    def start_course(slug, title):
+        return CourseJob(slug, title, root_dir / slug, downloads, finish_course, bar,
+                         global_index, course_rank(slug, title))
+
+    http_stats = {}
+    global_index = IndexWriter(root_dir / "global_index.csv", GLOBAL_INDEX_HEADER)
+    try:
+        async with make_session(http_stats, max_concurrency) as sess:
+            bar = tqdm(total=0, unit="track", desc="downloads")
+            limiter = AdaptiveLimit(CONCURRENCY, max_concurrency)
+            cap = BandwidthCap(parse_bandwidth(bandwidth))
+            dl_tasks = [asyncio.create_task(download_worker(downloads, sess, bar, store, journal,
+                                                          snapshot, limiter, cap, resume))
+                        for _ in range(limiter.ceiling)]
+            dl_tasks.append(asyncio.create_task(limiter.run()))
+
+            await discover(start_course, completed_courses)
+
+            # discovery is over; let the download pool drain what is left
+            await downloads.join()
+            for t in dl_tasks:
+                t.cancel()
+            bar.close()
+    finally:
+        # even after a crash, replace the append-only index with a sorted one
+        global_index.close()
+        journal.export_global(snapshot, root_dir / "global_index.csv")
+        journal.close()
+        compact_manifest(manifest_file)
+
+    print_connection_stats(http_stats)
+    limiter.report()
+    cap.report()
     print(f"\nFinished! Backups in: {root_dir}")
 
 
 if __name__ == "__main__":
     args = parse_args()
 
-    if not args.email or not args.password:
+    if args.verify:
+        sys.exit(verify_tree(Path(args.verify)))
+
+    if args.from_manifest is None and (not args.email or not args.password):
         print("Error: Email and password required.")
         print("Set SOUNDWISE_EMAIL and SOUNDWISE_PASSWORD in .env file")
         print("Or use --email and --password arguments")
@@ -342,5 +1801,16 @@ if __name__ == "__main__":
         args.password,
         resume=args.resume,
         headless=args.headless,
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        page_workers=args.page_workers,
+        discovery=args.discovery,
+        from_manifest=args.from_manifest,
+        max_concurrency=args.max_concurrency,
+        lean_pages=args.lean_pages,
+        debug=args.debug,
+        fresh_login=args.fresh_login,
+        estimate=args.estimate,
+        bandwidth=args.bandwidth,
+        order=args.order,
+        pinned=args.pin
     ))
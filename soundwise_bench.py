@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Soundwise stand-in server + download-pipeline benchmark
+
+Serves a fake soundcast library over plain HTTP so soundwise_backup_v2.py can
+be measured without touching the real service:
+
+- /signin            login form (any email/password works)
+- /mysoundcasts      card list
+- /mysoundcasts/<x>  course page with play buttons; it also fetches the
+                     track list as JSON, like the real app
+- /media/<x>/<n>.mp3 audio with Range/If-Range, ETag/Last-Modified and HEAD support,
+                     plus configurable latency, bandwidth, resets and 429s
+
+Usage:
+  # Just run the stand-in (point SOUNDWISE_APP_URL at it):
+  python soundwise_bench.py serve --port 8089 --courses 20 --tracks 15
+
+  # Benchmark downloads only (manifest replay, no browser):
+  python soundwise_bench.py run --courses 20 --tracks 15 --size-mb 5
+
+  # Benchmark the whole pipeline including Playwright discovery:
+  python soundwise_bench.py run --mode full --page-workers 4
+
+  # Make the network hostile and compare two settings:
+  python soundwise_bench.py run --reset-rate 0.05 --throttle-rate 0.02 --label before
+  python soundwise_bench.py run --reset-rate 0.05 --throttle-rate 0.02 --label after
+
+Every run appends a row to bench_results.csv (tracks/s, MB/s, retries,
+peak memory, ...) so results can be compared objectively.
+"""
+
+import argparse
+import asyncio
+import csv
+import datetime
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+try:
+    import resource  # not on Windows
+except ImportError:
+    resource = None
+
+# ─── USER SETTINGS ───────────────────────────────────────────────────
+DEFAULT_PORT = 8089
+RESULTS_FILE = Path("bench_results.csv")
+CHUNK = 64 * 1024
+# ─────────────────────────────────────────────────────────────────────
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Local Soundwise stand-in and benchmark runner.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=["serve", "run"])
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the library and faults")
+
+    lib = parser.add_argument_group("library")
+    lib.add_argument("--courses", type=int, default=10)
+    lib.add_argument("--tracks", type=int, default=12, help="Tracks per course")
+    lib.add_argument("--size-mb", type=float, default=2.0,
+                     help="Mean track size; actual sizes vary 50-150%%")
+    lib.add_argument("--no-api", action="store_true",
+                     help="Don't expose the JSON track list (forces click discovery)")
+
+    net = parser.add_argument_group("network")
+    net.add_argument("--latency-ms", type=float, default=20, help="Delay before each media response")
+    net.add_argument("--page-latency-ms", type=float, default=100, help="Delay before each app page")
+    net.add_argument("--bandwidth-mbps", type=float, default=0,
+                     help="Per-connection cap in Mbit/s (0 = unlimited)")
+    net.add_argument("--reset-rate", type=float, default=0.0,
+                     help="Chance a media transfer is cut off part way")
+    net.add_argument("--throttle-rate", type=float, default=0.0,
+                     help="Chance a media request gets a 429")
+
+    run = parser.add_argument_group("run")
+    run.add_argument("--mode", choices=["downloads", "full"], default="downloads",
+                     help="downloads: replay a manifest (no browser); full: whole pipeline")
+    run.add_argument("--concurrency", type=int, default=None, help="SOUNDWISE_CONCURRENCY")
+    run.add_argument("--max-concurrency", type=int, default=None, help="SOUNDWISE_MAX_CONCURRENCY")
+    run.add_argument("--page-workers", type=int, default=1)
+    run.add_argument("--headful", dest="headless", action="store_false",
+                     help="Show the browser in --mode full")
+    run.add_argument("--label", default="", help="Free text stored with the result row")
+    run.add_argument("--keep", action="store_true", help="Keep the output directory")
+    return parser.parse_args()
+
+
+# ─── stand-in server ────────────────────────────────────────────────
+def build_library(args):
+    """slug -> (title, [track sizes]) ; deterministic for a given seed."""
+    rnd = random.Random(args.seed)
+    mean = int(args.size_mb * 1_000_000)
+    library = {}
+    for c in range(args.courses):
+        slug = f"bench-course-{c + 1:03d}"
+        sizes = [int(mean * rnd.uniform(0.5, 1.5)) for _ in range(args.tracks)]
+        library[slug] = (f"Bench Course {c + 1:03d}", sizes)
+    return library
+
+
+def track_url(base, slug, n):
+    return f"{base}/media/{slug}/track-{n + 1:03d}.mp3"
+
+
+def page(title, body):
+    return web.Response(
+        content_type="text/html",
+        text=f"<!doctype html><html><head><title>{title}</title></head><body>{body}</body></html>",
+    )
+
+
+async def app_delay(request):
+    await asyncio.sleep(request.app["args"].page_latency_ms / 1000)
+
+
+def logged_in(request):
+    return request.cookies.get("bench_session") == "ok"
+
+
+async def signin_get(request):
+    await app_delay(request)
+    return page("Sign in", """
+<form method="post" action="/signin">
+  <input type="email" name="email">
+  <input type="password" name="password">
+  <button type="submit">Log in</button>
+</form>""")
+
+
+async def signin_post(request):
+    await app_delay(request)
+    resp = web.HTTPFound("/mysoundcasts")
+    resp.set_cookie("bench_session", "ok")
+    raise resp
+
+
+async def card_list(request):
+    await app_delay(request)
+    if not logged_in(request):
+        raise web.HTTPFound("/signin")
+    cards = "".join(
+        f'<a href="/mysoundcasts/{slug}"><label>{title}</label><br>Current access: lifetime</a><br>'
+        for slug, (title, _) in request.app["library"].items())
+    return page("My soundcasts", cards)
+
+
+async def course_page(request):
+    await app_delay(request)
+    if not logged_in(request):
+        raise web.HTTPFound("/signin")
+    slug = request.match_info["slug"]
+    title, sizes = request.app["library"][slug]
+    # URLs are only built in JS, so with --no-api nothing in the HTML gives
+    # them away and discovery has to fall back to clicking
+    rows = "".join(
+        f'<div class="track-pause-play" data-n="{n + 1:03d}">'
+        f'<i class="material-icons play">play_arrow</i> Track {n + 1}</div>'
+        for n in range(len(sizes)))
+    api = "" if request.app["args"].no_api else f"fetch('/api/soundcasts/{slug}');"
+    script = """
+<audio id="player"></audio>
+<script>
+%s
+const player = document.getElementById('player');
+document.querySelectorAll('div.track-pause-play').forEach(btn => {
+  btn.addEventListener('click', () => {
+    const src = '/media/%s/track-' + btn.dataset.n + '.mp3';
+    if (player.dataset.current === src && !player.paused) { player.pause(); return; }
+    player.dataset.current = src;
+    player.src = src;
+    player.play().catch(() => {});
+  });
+});
+</script>""" % (api, slug)
+    return page(title, f"<h1>{title}</h1>{rows}{script}")
+
+
+async def course_api(request):
+    slug = request.match_info["slug"]
+    title, sizes = request.app["library"][slug]
+    base = request.app["base"]
+    return web.json_response({
+        "title": title,
+        "lectures": [{"title": f"Track {n + 1}", "url": track_url(base, slug, n)}
+                     for n in range(len(sizes))],
+    })
+
+
+def body_block(slug, n):
+    """Deterministic 64 KiB pattern per track so content hashes are stable."""
+    seed = hashlib.sha256(f"{slug}/{n}".encode()).digest()
+    return (seed * (CHUNK // len(seed) + 1))[:CHUNK]
+
+
+async def media(request):
+    args, stats = request.app["args"], request.app["stats"]
+    slug = request.match_info["slug"]
+    n = int(request.match_info["n"]) - 1
+    size = request.app["library"][slug][1][n]
+    stats["requests"] += 1
+    if request.method == "HEAD":
+        stats["head"] += 1
+
+    await asyncio.sleep(args.latency_ms / 1000)
+    if request.method == "GET" and random.random() < args.throttle_rate:
+        stats["throttled"] += 1
+        return web.Response(status=429, headers={"Retry-After": "1"})
+
+    etag = f'"{slug}-{n}-{size}"'
+    headers = {"ETag": etag, "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+               "Accept-Ranges": "bytes", "Content-Type": "audio/mpeg"}
+    if request.headers.get("If-None-Match") == etag:
+        stats["not_modified"] += 1
+        return web.Response(status=304, headers=headers)
+
+    start, end = 0, size - 1
+    rng = request.headers.get("Range", "")
+    if_range = request.headers.get("If-Range")
+    if rng and if_range and if_range not in (etag, headers["Last-Modified"]):
+        rng = ""  # changed since the client's partial copy: send it whole
+    if rng.startswith("bytes="):
+        first, _, last = rng[6:].partition("-")
+        start = int(first or 0)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size:
+            return web.Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+        stats["ranged"] += 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    resp = web.StreamResponse(status=206 if rng else 200, headers=headers)
+    resp.content_length = end - start + 1
+    await resp.prepare(request)
+    if request.method == "HEAD":
+        return resp
+
+    cut = None
+    if random.random() < args.reset_rate:
+        cut = start + int((end - start) * random.uniform(0.1, 0.9))
+    block = body_block(slug, n)
+    per_chunk = CHUNK * 8 / (args.bandwidth_mbps * 1e6) if args.bandwidth_mbps else 0
+
+    pos = start
+    while pos <= end:
+        off = pos % CHUNK
+        piece = block[off:off + min(CHUNK - off, end - pos + 1)]
+        if cut is not None and pos + len(piece) > cut:
+            stats["resets"] += 1
+            request.transport.close()
+            return resp
+        await resp.write(piece)
+        stats["bytes"] += len(piece)
+        pos += len(piece)
+        if per_chunk:
+            await asyncio.sleep(per_chunk * len(piece) / CHUNK)
+    return resp
+
+
+async def stats_view(request):
+    return web.json_response(request.app["stats"])
+
+
+async def manifest_view(request):
+    base = request.app["base"]
+    now = datetime.datetime.now().isoformat()
+    return web.json_response({"courses": {
+        slug: {"title": title,
+               "tracks": [track_url(base, slug, n) for n in range(len(sizes))],
+               "discovered_at": now}
+        for slug, (title, sizes) in request.app["library"].items()}})
+
+
+def make_app(args):
+    app = web.Application()
+    app["args"] = args
+    app["library"] = build_library(args)
+    app["base"] = f"http://127.0.0.1:{args.port}"
+    app["stats"] = {k: 0 for k in ("requests", "head", "ranged", "not_modified",
+                                   "throttled", "resets", "bytes")}
+    app.router.add_get("/signin", signin_get)
+    app.router.add_post("/signin", signin_post)
+    app.router.add_get("/mysoundcasts", card_list)
+    app.router.add_get("/mysoundcasts/{slug}", course_page)
+    app.router.add_get("/api/soundcasts/{slug}", course_api)
+    app.router.add_route("*", "/media/{slug}/track-{n:\\d+}.mp3", media)
+    app.router.add_get("/__stats", stats_view)
+    app.router.add_get("/__manifest", manifest_view)
+    return app
+
+
+def serve(args):
+    random.seed(args.seed)
+    print(f"Soundwise stand-in on http://127.0.0.1:{args.port}  "
+          f"({args.courses} courses x {args.tracks} tracks)")
+    web.run_app(make_app(args), host="127.0.0.1", port=args.port, print=None)
+# ─────────────────────────────────────────────────────────────────────
+
+
+# ─── benchmark runner ───────────────────────────────────────────────
+def peak_memory_mb():
+    """Peak RSS of this process, or None when the platform can't say."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1 << 20)
+    except ImportError:
+        return None
+
+
+def server_command(args):
+    cmd = [sys.executable, __file__, "serve", "--port", str(args.port), "--seed", str(args.seed)]
+    for flag in ("courses", "tracks", "size_mb", "latency_ms", "page_latency_ms",
+                 "bandwidth_mbps", "reset_rate", "throttle_rate"):
+        cmd += ["--" + flag.replace("_", "-"), str(getattr(args, flag))]
+    if args.no_api:
+        cmd.append("--no-api")
+    return cmd
+
+
+async def wait_for_server(base, timeout=15):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as s:
+        while True:
+            try:
+                async with s.get(f"{base}/__stats") as r:
+                    return await r.json()
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+
+async def fetch_json(base, path):
+    async with aiohttp.ClientSession() as s:
+        async with s.get(f"{base}{path}") as r:
+            return await r.json()
+
+
+async def run_benchmark(args):
+    base = f"http://127.0.0.1:{args.port}"
+    out_dir = Path(tempfile.mkdtemp(prefix="soundwise-bench-"))
+
+    # settings are read at import time, so set them before importing
+    os.environ["SOUNDWISE_APP_URL"] = base
+    if args.concurrency:
+        os.environ["SOUNDWISE_CONCURRENCY"] = str(args.concurrency)
+    if args.max_concurrency:
+        os.environ["SOUNDWISE_MAX_CONCURRENCY"] = str(args.max_concurrency)
+    import soundwise_backup_v2 as sw
+
+    server = subprocess.Popen(server_command(args))
+    try:
+        await wait_for_server(base)
+        manifest_arg = None
+        if args.mode == "downloads":
+            manifest_file = out_dir / "bench_manifest.json"
+            manifest_file.write_text(json.dumps(await fetch_json(base, "/__manifest")))
+            manifest_arg = str(manifest_file)
+
+        started = time.monotonic()
+        await sw.main(
+            "bench@example.com", "bench",
+            headless=args.headless,
+            output_dir=str(out_dir),
+            page_workers=args.page_workers,
+            from_manifest=manifest_arg,
+        )
+        elapsed = time.monotonic() - started
+        stats = await fetch_json(base, "/__stats")
+    finally:
+        server.terminate()
+        server.wait()
+
+    tracks = list(out_dir.glob("*/*/*.mp3"))
+    nbytes = sum(p.stat().st_size for p in tracks)
+    expected = args.courses * args.tracks
+    gets = stats["requests"] - stats["head"]
+    result = {
+        "when": datetime.datetime.now().isoformat(timespec="seconds"),
+        "label": args.label,
+        "mode": args.mode,
+        "courses": args.courses,
+        "tracks": len(tracks),
+        "expected_tracks": expected,
+        "mb": round(nbytes / 1e6, 1),
+        "seconds": round(elapsed, 2),
+        "tracks_per_s": round(len(tracks) / elapsed, 2),
+        "mb_per_s": round(nbytes / 1e6 / elapsed, 2),
+        "media_gets": gets,
+        "retries": max(0, gets - len(tracks)),
+        "ranged": stats["ranged"],
+        "throttled": stats["throttled"],
+        "resets": stats["resets"],
+        "wire_mb": round(stats["bytes"] / 1e6, 1),
+        "peak_mem_mb": round(peak_memory_mb() or 0, 1) or "n/a",
+        "concurrency": sw.CONCURRENCY,
+        "max_concurrency": sw.MAX_CONCURRENCY,
+        "page_workers": args.page_workers,
+        "reset_rate": args.reset_rate,
+        "throttle_rate": args.throttle_rate,
+        "bandwidth_mbps": args.bandwidth_mbps,
+    }
+
+    print("\n── benchmark ─────────────────────────────")
+    for key, value in result.items():
+        print(f"  {key:16} {value}")
+
+    fresh = not RESULTS_FILE.exists()
+    with open(RESULTS_FILE, "a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=list(result))
+        if fresh:
+            w.writeheader()
+        w.writerow(result)
+    print(f"Result appended to {RESULTS_FILE}")
+
+    if args.keep:
+        print(f"Output kept in {out_dir}")
+    else:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return 0 if len(tracks) == expected else 1
+# ─────────────────────────────────────────────────────────────────────
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "serve":
+        serve(args)
+    else:
+        sys.exit(asyncio.run(run_benchmark(args)))
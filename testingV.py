@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import os, re, glob, time, random, argparse, datetime
-from typing import List, Tuple
+import os, re, time, argparse, datetime, contextlib
+import gzip
+from typing import List, Tuple, Optional
 from yt_dlp import YoutubeDL
 from yt_dlp.utils import DownloadError
+from caption_text import captions_to_text
+from caption_fetch import AdaptivePacer, PacedYoutubeDL, rate_limit_hint, throttle_recorded, download_captions
 
 # =======================
 # CONFIG (defaults)
@@ -12,56 +15,47 @@ from yt_dlp.utils import DownloadError
 SINGLE_VIDEO_URL = ""  # e.g. "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
 CHANNEL_URL      = "https://www.youtube.com/@danmartell"
 
-SUB_DIR            = "subs"
+SUB_DIR            = "subs"      # raw subtitles (gzipped), only with --keep-subs
+KEEP_RAW_SUBS      = False
+SUB_LANGS          = ["en", "en-US", "en-GB"]   # track preference (--sub-langs); exact before variants
 MAX_VIDEOS         = None      # e.g. 100 while testing
 COOKIE_FILE        = r"C:\Scripts\cookies-yt.txt"   # keep as raw string on Windows
 
 # Start at Nth video (1-indexed). Example: 496 means skip first 495.
 START_AT_DEFAULT   = 1
 
-# Sleep controls (tune to be gentler)
-PER_VIDEO_SLEEP_S  = (3, 8)    # random sleep between videos (min,max)
-REQ_SLEEP_S        = (2, 5)    # random sleep between HTTP requests
-BATCH_SIZE         = 100       # pause after this many videos
-BATCH_PAUSE_S      = 300       # pause length between batches (seconds)
+# Pacing (tune to be gentler): every HTTP request goes through an adaptive
+# controller that speeds up while YouTube is happy and slows down on 429s
+REQUESTS_PER_MIN   = 15        # starting request rate (--rpm)
+REQUEST_BURST      = 3         # requests allowed back-to-back after idling
+MIN_DELAY_S        = 1.0       # fastest pacing the controller may reach
+MAX_DELAY_S        = 60.0      # slowest pacing
+DELAY_STEP_S       = 0.25      # speed-up per clean window
+AIMD_WINDOW        = 40        # requests per evaluation window
 
-# Backoff on rate-limit
+# Hold on rate-limit when the server gives no Retry-After
 BACKOFF_SCHEDULE   = [300, 600, 1200, 1800]   # 5m, 10m, 20m, 30m
 
-os.makedirs(SUB_DIR, exist_ok=True)
-
-# yt-dlp options
+# yt-dlp options: one engine is built from YDL_DL_OPTS for the whole run;
+# listing and metadata lookups apply these overrides to it temporarily
 YDL_LIST_OPTS = {
     "quiet": False,
     "extract_flat": True,
-    "skip_download": True,
-    "cookiefile": COOKIE_FILE,
 }
 YDL_META_OPTS = {
     "quiet": True,
-    "skip_download": True,
-    "cookiefile": COOKIE_FILE,
 }
+# metadata only: download_captions picks one track and fetches it in memory
 YDL_DL_OPTS = {
     "quiet": False,
     "skip_download": True,
-    "writesubtitles": True,
-    "writeautomaticsub": True,
-    "subtitleslangs": ["en", "en-US", "en-GB"],
-    "subtitlesformat": "srt",
     "retries": 10,
-
-    # sleep BETWEEN HTTP REQUESTS (random in range)
-    "sleep_interval_requests": REQ_SLEEP_S[0],
-    "max_sleep_interval_requests": REQ_SLEEP_S[1],
-
-    # sleep BETWEEN VIDEOS (random in range)
-    "sleep_interval": PER_VIDEO_SLEEP_S[0],
-    "max_sleep_interval": PER_VIDEO_SLEEP_S[1],
-
-    "cookiefile": COOKIE_FILE,
-    "outtmpl": {"subtitle": os.path.join(SUB_DIR, "%(id)s.%(language)s.%(ext)s")},
+    # no fixed sleeps: request pacing is done by AdaptivePacer
 }
+# only when the file exists: yt-dlp writes the cookie jar back on close,
+# which would otherwise create an empty one at that path
+if os.path.exists(COOKIE_FILE):
+    YDL_DL_OPTS["cookiefile"] = COOKIE_FILE
 
 # ---------------- helpers ----------------
 def sanitize_filename(name: str, max_len: int = 120) -> str:
@@ -74,11 +68,11 @@ def _canonicalize_channel_url(url: str) -> str:
         return url.rstrip("/") + "/videos"
     return url
 
-def list_channel_video_ids(channel_videos_url: str, limit: int | None) -> List[str]:
+def list_channel_video_ids(ydl: YoutubeDL, channel_videos_url: str, limit: int | None) -> List[str]:
     url = _canonicalize_channel_url(channel_videos_url)
     print(f"Listing videos from: {url}")
     ids: List[str] = []
-    with YoutubeDL(YDL_LIST_OPTS) as ydl:
+    with engine_params(ydl, **YDL_LIST_OPTS):
         info = ydl.extract_info(url, download=False)
         for e in (info.get("entries") or []):
             if e.get("_type") == "url" and e.get("ie_key") == "Youtube" and e.get("id"):
@@ -88,35 +82,51 @@ def list_channel_video_ids(channel_videos_url: str, limit: int | None) -> List[s
     print(f"Found {len(ids)} video(s).")
     return ids
 
-def resolve_channel_name_from_video(video_url_or_id: str) -> str | None:
+def resolve_channel_name_from_video(ydl: YoutubeDL, video_url_or_id: str) -> str | None:
     url = video_url_or_id
     if re.fullmatch(r"[\w-]{11}", video_url_or_id):
         url = f"https://www.youtube.com/watch?v={video_url_or_id}"
-    with YoutubeDL(YDL_META_OPTS) as ydl:
+    with engine_params(ydl, **YDL_META_OPTS):
         info = ydl.extract_info(url, download=False)
     for key in ("uploader", "channel", "artist", "creator", "uploader_id"):
         if info.get(key):
             return str(info[key])
     return None
 
-def download_captions(video_url: str) -> Tuple[str, List[str]]:
-    with YoutubeDL(YDL_DL_OPTS) as ydl:
-        info = ydl.extract_info(video_url, download=True)
-        vid = info.get("id")
-    srt_paths = sorted(glob.glob(os.path.join(SUB_DIR, f"{vid}.*.srt")))
-    return video_url, srt_paths
-
-def srt_to_plain_text(srt_path: str) -> str:
-    out = []
-    with open(srt_path, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            line = line.rstrip("\n")
-            if not line or line.isdigit() or "-->" in line:
-                continue
-            cleaned = re.sub(r"\s+", " ", line).strip()
-            if cleaned:
-                out.append(cleaned)
-    return "\n".join(out)
+def save_raw_subtitles(vid: str, track: tuple):
+    lang, _, ext, data = track
+    os.makedirs(SUB_DIR, exist_ok=True)
+    with gzip.open(os.path.join(SUB_DIR, f"{vid}.{lang}.{ext}.gz"), "wt", encoding="utf-8") as f:
+        f.write(data)
+
+# ---------------- engine ----------------
+# Building a YoutubeDL loads the cookie file, instantiates extractors and
+# opens fresh connections, and closing one rewrites the cookie file; the run
+# keeps a single engine instead of paying that for every video.
+def open_engine(opts: dict, pacer: Optional[AdaptivePacer] = None) -> Tuple[YoutubeDL, float]:
+    t0 = time.perf_counter()
+    ydl = PacedYoutubeDL(opts, pacer)
+    ydl.cookiejar  # load cookies now rather than on the first request
+    return ydl, time.perf_counter() - t0
+
+@contextlib.contextmanager
+def engine_params(ydl: YoutubeDL, **overrides):
+    saved = {k: ydl.params.get(k) for k in overrides}
+    ydl.params.update(overrides)
+    try:
+        yield ydl
+    finally:
+        ydl.params.update(saved)
+
+def measure_engine_setup(opts: dict, runs: int = 5) -> float:
+    """Average seconds to build, load cookies for and close one engine (no network)."""
+    total = 0.0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        with YoutubeDL({**opts, "quiet": True}) as ydl:
+            ydl.cookiejar
+        total += time.perf_counter() - t0
+    return total / runs
 
 def append_to_output(output_file: str, header: str, url: str, body: str | None):
     with open(output_file, "a", encoding="utf-8") as out:
@@ -162,11 +172,36 @@ def parse_args():
                    help="Channel URL (handle or /videos) to process.")
     p.add_argument("--fresh", action="store_true",
                    help="Start over: backup and recreate output/progress files.")
+    p.add_argument("--measure-engine", action="store_true",
+                   help="Time engine setup (per-video rebuild vs. one reused engine) and exit.")
+    p.add_argument("--rpm", type=float, default=REQUESTS_PER_MIN,
+                   help="Starting request rate per minute; adapts up/down from here (default: %(default)s).")
+    p.add_argument("--keep-subs", action="store_true", default=KEEP_RAW_SUBS,
+                   help=f"Also keep raw subtitle files, gzipped, in {SUB_DIR}/.")
+    p.add_argument("--sub-langs", type=lambda v: [l.strip() for l in v.split(",") if l.strip()],
+                   default=SUB_LANGS,
+                   help="Comma-separated subtitle language preference; one track is fetched "
+                        "per video, manual before auto-generated (default: en,en-US,en-GB).")
     return p.parse_args()
 
 def main():
     args = parse_args()
 
+    if args.measure_engine:
+        per_video = measure_engine_setup(YDL_DL_OPTS)
+        ydl, setup_s = open_engine({**YDL_DL_OPTS, "quiet": True})
+        ydl.close()
+        print(f"Engine setup: {per_video*1000:.0f} ms per video when rebuilt each time; "
+              f"{setup_s*1000:.0f} ms once per run when reused")
+        return
+
+    pacer = AdaptivePacer(args.rpm, MIN_DELAY_S, MAX_DELAY_S, DELAY_STEP_S, AIMD_WINDOW,
+                          REQUEST_BURST, BACKOFF_SCHEDULE)
+    ydl, setup_s = open_engine(YDL_DL_OPTS, pacer)
+    with ydl:
+        run(args, ydl, pacer, setup_s)
+
+def run(args, ydl: YoutubeDL, pacer: AdaptivePacer, setup_s: float):
     if args.single and args.channel and args.single.strip() and args.channel.strip():
         print("Please set ONLY one of --single or --channel.")
         return
@@ -175,11 +210,11 @@ def main():
     if args.single and args.single.strip():
         print("Mode: single video")
         targets = [args.single.strip()]
-        ch_name = resolve_channel_name_from_video(args.single.strip()) or "captions"
+        ch_name = resolve_channel_name_from_video(ydl, args.single.strip()) or "captions"
     else:
         print("Mode: channel")
         limit = args.max if args.max is not None else MAX_VIDEOS
-        ids = list_channel_video_ids(args.channel.strip(), limit)
+        ids = list_channel_video_ids(ydl, args.channel.strip(), limit)
         if not ids:
             print("No videos found.")
             return
@@ -193,14 +228,17 @@ def main():
         print(f"Starting at video #{start_at}. Processing {len(ids)} remaining.")
 
         targets = [f"https://www.youtube.com/watch?v={vid}" for vid in ids]
-        ch_name = resolve_channel_name_from_video(ids[0]) or "captions"
+        ch_name = resolve_channel_name_from_video(ydl, ids[0]) or "captions"
 
     base_name    = sanitize_filename(ch_name)
     output_file  = f"{base_name}.txt"
     progress_file = f"{base_name}.progress.txt"   # <-- per-channel progress!
+    pacing_log    = f"{base_name}.pacing.log"
 
     print(f"Writing to: {output_file}")
     print(f"Progress file: {progress_file}")
+    print(f"Pacing log: {pacing_log}")
+    pacer.set_log(pacing_log)
 
     # Fresh mode: backup existing files, then start new ones
     if args.fresh:
@@ -218,38 +256,43 @@ def main():
 
     print(f"Already done (from progress): {len(done)}; remaining: {len(remaining)}")
 
-    backoff_try = 0
-    processed_since_pause = 0
+    fetch_times: List[float] = []
 
-    for i, url in enumerate(remaining, start=1):
+    i = 0
+    attempts = 0  # rate-limited tries of remaining[i]; capped like testingV5_2
+    while i < len(remaining):
+        url = remaining[i]
         vid = url.rsplit("v=", 1)[-1]
-        print(f"\n[{i}/{len(remaining)}] Fetching captions for: {url}")
+        print(f"\n[{i+1}/{len(remaining)}] Fetching captions for: {url}")
 
         try:
-            _, srt_files = download_captions(url)
-            if not srt_files:
-                print("  No .srt captions saved.")
+            t0 = time.perf_counter()
+            vid_id, track, _ = download_captions(ydl, url, args.sub_langs)
+            fetch_times.append(time.perf_counter() - t0)
+            if args.keep_subs and track:
+                save_raw_subtitles(vid_id, track)
+            if not track:
+                print("  No captions available.")
                 append_to_output(output_file, f"Video {vid}", url, None)
             else:
-                # prefer English if available
-                choice = next((p for p in srt_files if re.search(r"\.en(\.|$)", p)), srt_files[0])
-                text = srt_to_plain_text(choice)
-                print(f"  ✓ Captions parsed from {os.path.basename(choice)} ({len(text)} chars)")
+                lang, kind, ext, data = track
+                text = captions_to_text(data, ext, dedupe=(kind == "auto"))  # only auto captions roll
+                print(f"  ✓ Captions parsed from {vid_id}.{lang}.{ext} ({kind}, {len(text)} chars)")
                 append_to_output(output_file, f"Video {vid}", url, text)
 
             save_progress(progress_file, vid)
-            backoff_try = 0  # reset backoff on success
-            processed_since_pause += 1
 
         except DownloadError as e:
             print(f"  ✗ Error: {e}")
             if is_rate_limit_error(e):
-                wait = BACKOFF_SCHEDULE[min(backoff_try, len(BACKOFF_SCHEDULE)-1)]
-                print(f"  ⏳ Hit rate-limit. Backing off for {wait} seconds …")
-                time.sleep(wait)
-                backoff_try += 1
-                # retry the same URL after backoff
-                continue
+                print("  ⏳ Hit rate-limit. Backing off …")
+                if not throttle_recorded(e):  # a plain 429 was already counted (and held) by the engine
+                    pacer.record_throttle(rate_limit_hint(e), why=f"rate-limited on {vid}", hold=True, retry=url)
+                attempts += 1
+                if attempts <= len(BACKOFF_SCHEDULE):
+                    # retry the same URL; the pacer holds and probes before letting it through
+                    continue
+                print(f"  ✗ Still rate-limited after {len(BACKOFF_SCHEDULE)} backoffs; leaving {vid} for the next run")
             else:
                 append_to_output(output_file, f"Video {vid}", url, None)
                 save_progress(progress_file, vid)
@@ -258,16 +301,13 @@ def main():
             append_to_output(output_file, f"Video {vid}", url, None)
             save_progress(progress_file, vid)
 
-        # batch pause to be gentle
-        if BATCH_SIZE and processed_since_pause >= BATCH_SIZE:
-            print(f"\n⏸  Batch pause {BATCH_PAUSE_S}s to avoid limits …")
-            time.sleep(BATCH_PAUSE_S)
-            processed_since_pause = 0
-
-        # extra per-video sleep (randomized)
-        sleep_s = random.uniform(*PER_VIDEO_SLEEP_S)
-        time.sleep(sleep_s)
+        i += 1
+        attempts = 0
 
+    if fetch_times:
+        print(f"\nEngine: set up once in {setup_s:.2f}s; {len(fetch_times)} fetches, "
+              f"{sum(fetch_times)/len(fetch_times):.2f}s avg per video")
+    print(f"Pacing: {pacer.report()}")
     print(f"\nDone – captions saved to {output_file}")
 
 if __name__ == "__main__":
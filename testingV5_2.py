@@ -6,33 +6,56 @@ YouTube caption collector — v5.2 (interactive)
   1) Is this a channel? [Y/n]
   2) URL (channel handle/URL or single video URL)
   3) Start at which video #? [1]
+• Batch, no prompts: --channels FILE (one channel URL per line) runs every
+  channel through one process and one request budget, videos interleaved
+  round-robin across channels; combine with --sync for new uploads only
 • Per-channel folder + safe resume (never auto-deletes)
 • Per-video .txt and combined channel .txt ("paper style" – no timestamps)
-• Gentle rate-limit handling + tunable sleeps
+• Subtitles handled in memory; raw files only with --keep-subs (gzipped)
+• Text via caption_text.py: SRT/VTT/json3, rolling auto-caption repeats removed
+• Several videos in flight, all sharing one requests/minute budget
+• Adaptive pacing: speeds up while clean, backs off on 429s (honours
+  Retry-After), probes before resuming; decisions logged per channel
+• Channel listing cached per channel folder; --sync lists only new uploads
+  (stops at the first known video) and fetches just those, numbering their
+  files on from the highest NN_ already in the folder
 • Uses cookies file if present (optional)
+• One long-lived yt-dlp engine per run (cookies/extractors set up once)
 """
 
-import os, re, glob, json, time, random, argparse, datetime, math
+import os, re, json, time, argparse, datetime, math, contextlib, queue, threading, itertools
+import gzip
 from typing import List, Tuple, Optional
 from yt_dlp import YoutubeDL
 from yt_dlp.utils import DownloadError
+from caption_text import captions_to_text
+from caption_fetch import AdaptivePacer, PacedYoutubeDL, rate_limit_hint, throttle_recorded, download_captions
 
 # =======================
 # Defaults (edit if you like)
 # =======================
 BASE_DIR          = "captions"
+CHANNEL_INDEX     = "channels.json"               # in BASE_DIR: channel URL -> folder, for --sync
+BATCH_PACING_LOG  = "batch.pacing.log"            # in BASE_DIR: the shared budget's log for --channels
+PER_VIDEO_RE      = re.compile(r"^(\d+)_([\w-]{11})\.txt$")  # NN_<video id>.txt in a channel folder
 SUB_DIR_NAME      = "subs"
+KEEP_RAW_SUBS     = False                         # also save raw subtitles as subs/<id>.<lang>.<ext>.gz
+SUB_LANGS         = ["en", "en-US", "en-GB"]      # preference order (--sub-langs); variants rank after exact
 COOKIE_FILE       = r"C:\Scripts\cookies-yt.txt"  # set to your exported cookies file; or leave as is
 USE_COOKIES_FILE  = True                          # auto-disabled if file missing
 BROWSER_COOKIES   = None                          # e.g. "chrome" to pull directly from browser; None = off
 
-# Sleeps (be gentle with YouTube)
-PER_VIDEO_SLEEP_S = (3, 8)         # random sleep between videos
-REQ_SLEEP_S       = (2, 5)         # yt-dlp per-request sleep
-BATCH_SIZE        = 100            # pause every N processed videos (0 = off)
-BATCH_PAUSE_S     = 300            # seconds to pause between batches
-
-# Backoff when rate-limited
+# Pacing (be gentle with YouTube): every HTTP request yt-dlp makes draws
+# from one shared, adaptive budget, however many videos are in flight
+WORKERS           = 4              # videos fetched at once (--workers)
+REQUESTS_PER_MIN  = 30             # starting request rate (--rpm); adapts from here
+REQUEST_BURST     = 3              # requests allowed back-to-back after idling
+MIN_DELAY_S       = 0.5            # fastest pacing the controller may reach
+MAX_DELAY_S       = 60.0           # slowest pacing
+DELAY_STEP_S      = 0.2            # speed-up per clean window
+AIMD_WINDOW       = 40             # requests per evaluation window
+
+# Hold when rate-limited and the server gives no Retry-After
 BACKOFF_SCHEDULE  = [300, 600, 1200, 1800]  # 5m, 10m, 20m, 30m
 
 # =======================
@@ -52,16 +75,11 @@ def _canonicalize_channel_url(url: str) -> str:
         return url.rstrip("/") + "/videos"
     return url
 
-def list_channel_video_ids(channel_videos_url: str) -> List[str]:
+def list_channel_video_ids(channel_videos_url: str, ydl: YoutubeDL) -> List[str]:
     url = _canonicalize_channel_url(channel_videos_url)
     print(f"Listing videos from: {url}")
     ids: List[str] = []
-    with YoutubeDL({
-        "quiet": False,
-        "extract_flat": True,
-        "skip_download": True,
-        **_cookie_opts_for_listing()
-    }) as ydl:
+    with engine_params(ydl, quiet=False, extract_flat=True):
         info = ydl.extract_info(url, download=False)
         for e in (info.get("entries") or []):
             if e.get("_type") == "url" and e.get("ie_key") == "Youtube" and e.get("id"):
@@ -69,33 +87,43 @@ def list_channel_video_ids(channel_videos_url: str) -> List[str]:
     print(f"Found {len(ids)} video(s).")
     return ids
 
-def resolve_channel_name_from_video(video_url_or_id: str) -> Optional[str]:
+def list_new_video_ids(channel_videos_url: str, ydl: YoutubeDL, known: set) -> List[str]:
+    """
+    Newest-first IDs up to (not including) the first one in ``known``.
+
+    The /videos tab is walked page by page and the walk stops as soon as a
+    known video shows up, so a sync only pays for the pages with new uploads.
+    """
+    url = _canonicalize_channel_url(channel_videos_url)
+    print(f"Syncing videos from: {url}")
+    ids: List[str] = []
+    with engine_params(ydl, quiet=False, extract_flat=True):
+        # process=False keeps "entries" a lazy generator: continuation pages
+        # are only requested when the loop gets to them
+        info = ydl.extract_info(url, download=False, process=False)
+        entries = info.get("entries")
+        if entries is None:  # redirect or not a tab: fall back to a full listing
+            entries = ({"_type": "url", "ie_key": "Youtube", "id": v}
+                       for v in list_channel_video_ids(url, ydl))
+        for e in entries:
+            if e.get("_type") == "url" and e.get("ie_key") == "Youtube" and e.get("id"):
+                if e["id"] in known:
+                    break
+                ids.append(e["id"])
+    print(f"Found {len(ids)} new video(s).")
+    return ids
+
+def resolve_channel_name_from_video(video_url_or_id: str, ydl: YoutubeDL) -> Optional[str]:
     url = video_url_or_id
     if re.fullmatch(r"[\w-]{11}", video_url_or_id):
         url = f"https://www.youtube.com/watch?v={video_url_or_id}"
-    with YoutubeDL({
-        "quiet": True,
-        "skip_download": True,
-        **_cookie_opts_for_listing()
-    }) as ydl:
+    with engine_params(ydl, quiet=True):
         info = ydl.extract_info(url, download=False)
     for key in ("uploader", "channel", "artist", "creator", "uploader_id"):
         if info.get(key):
             return str(info[key])
     return None
 
-def srt_to_plain_text(srt_path: str) -> str:
-    out = []
-    with open(srt_path, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            line = line.rstrip("\n")
-            if not line or line.isdigit() or "-->" in line:
-                continue
-            cleaned = re.sub(r"\s+", " ", line).strip()
-            if cleaned:
-                out.append(cleaned)
-    return "\n".join(out)
-
 def append_to_output(output_file: str, header: str, url: str, body: Optional[str]):
     with open(output_file, "a", encoding="utf-8") as out:
         out.write(f"\n\n=== {header} ===\n{url}\n\n")
@@ -111,6 +139,50 @@ def save_progress(progress_file: str, video_id: str):
     with open(progress_file, "a", encoding="utf-8") as f:
         f.write(video_id + "\n")
 
+# =======================
+# Channel listing cache
+# =======================
+def _channel_key(url: str) -> str:
+    return _canonicalize_channel_url(url.strip()).rstrip("/")
+
+def _read_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def _write_json(path: str, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)  # never leave a half-written cache behind
+
+def known_channel_dir(url: str) -> Optional[str]:
+    """Folder name of a channel seen before (captions/channels.json), without any request."""
+    return _read_json(os.path.join(BASE_DIR, CHANNEL_INDEX), {}).get(_channel_key(url))
+
+def remember_channel_dir(url: str, channel_safe: str):
+    ensure_dir(BASE_DIR)
+    path = os.path.join(BASE_DIR, CHANNEL_INDEX)
+    index = _read_json(path, {})
+    if index.get(_channel_key(url)) != channel_safe:
+        index[_channel_key(url)] = channel_safe
+        _write_json(path, index)
+
+def listing_file(channel_safe: str) -> str:
+    return os.path.join(BASE_DIR, channel_safe, f"{channel_safe}.listing.json")
+
+def load_listing(channel_safe: str) -> List[str]:
+    return _read_json(listing_file(channel_safe), {}).get("ids") or []
+
+def save_listing(channel_safe: str, url: str, ids: List[str]):
+    _write_json(listing_file(channel_safe), {
+        "url": _channel_key(url),
+        "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+        "ids": ids,  # newest first, as listed on /videos
+    })
+
 def is_rate_limit_error(err: Exception) -> bool:
     msg = str(err).lower()
     needles = [
@@ -133,14 +205,6 @@ def zero_pad(n: int) -> int:
 # =======================
 # Cookies handling
 # =======================
-def _cookie_opts_for_listing():
-    opts = {}
-    if USE_COOKIES_FILE and os.path.exists(COOKIE_FILE):
-        opts["cookiefile"] = COOKIE_FILE
-    elif BROWSER_COOKIES:
-        opts["cookiesfrombrowser"] = (BROWSER_COOKIES, True, None, None)
-    return opts
-
 def _cookie_opts_for_download():
     opts = {}
     if USE_COOKIES_FILE and os.path.exists(COOKIE_FILE):
@@ -152,30 +216,54 @@ def _cookie_opts_for_download():
 # =======================
 # Downloads
 # =======================
-def build_dl_opts(channel_sub_dir: str, sleep_video: Tuple[float, float], sleep_req: Tuple[float, float]):
+def build_dl_opts(quiet: bool = False):
+    # no subtitle options: yt-dlp only extracts metadata, and download_captions
+    # picks and fetches the one track we want
     return {
-        "quiet": False,
+        "quiet": quiet,
         "skip_download": True,
-        "writesubtitles": True,
-        "writeautomaticsub": True,
-        "subtitleslangs": ["en", "en-US", "en-GB"],
-        "subtitlesformat": "srt",
         "retries": 10,
-        # request sleeps
-        "sleep_interval_requests": sleep_req[0],
-        "max_sleep_interval_requests": sleep_req[1],
-        # file template for saved subtitles
-        "outtmpl": {"subtitle": os.path.join(channel_sub_dir, "%(id)s.%(language)s.%(ext)s")},
         **_cookie_opts_for_download()
     }
 
-def download_captions(video_url: str, dl_opts: dict) -> Tuple[str, List[str], dict]:
-    with YoutubeDL(dl_opts) as ydl:
-        info = ydl.extract_info(video_url, download=True)
-        vid  = info.get("id")
-    srt_dir = dl_opts["outtmpl"]["subtitle"].rsplit("%(id)s", 1)[0]
-    srt_paths = sorted(glob.glob(os.path.join(srt_dir, f"{vid}.*.srt")))
-    return vid, srt_paths, info
+def save_raw_subtitles(subs_dir: str, vid: str, track: tuple):
+    lang, _, ext, data = track
+    with gzip.open(os.path.join(subs_dir, f"{vid}.{lang}.{ext}.gz"), "wt", encoding="utf-8") as f:
+        f.write(data)
+
+# =======================
+# Extractor engine
+# =======================
+# A YoutubeDL instance loads the cookie file, instantiates extractors and
+# keeps its HTTP connections open; building one per video repeats all of that
+# (and rewrites the cookie file on every close).  Each worker keeps one engine
+# for the whole run (YoutubeDL is not safe to share between threads).
+def open_engine(opts: dict, pacer: Optional[AdaptivePacer] = None) -> Tuple[YoutubeDL, float]:
+    """Create a long-lived YoutubeDL and load cookies up front; returns (engine, setup seconds)."""
+    t0 = time.perf_counter()
+    ydl = PacedYoutubeDL(opts, pacer)
+    ydl.cookiejar  # cached on first access
+    return ydl, time.perf_counter() - t0
+
+@contextlib.contextmanager
+def engine_params(ydl: YoutubeDL, **overrides):
+    """Temporarily change options on the shared engine (e.g. flat listing)."""
+    saved = {k: ydl.params.get(k) for k in overrides}
+    ydl.params.update(overrides)
+    try:
+        yield ydl
+    finally:
+        ydl.params.update(saved)
+
+def measure_engine_setup(opts: dict, runs: int = 5) -> float:
+    """Average cost of a fresh engine per video (build, load cookies, close) – no network."""
+    total = 0.0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        with YoutubeDL({**opts, "quiet": True}) as ydl:
+            ydl.cookiejar
+        total += time.perf_counter() - t0
+    return total / runs
 
 # =======================
 # Interactive prompts
@@ -215,9 +303,20 @@ def main():
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument("--no-cookies", action="store_true")
     parser.add_argument("--browser-cookies", type=str, default=None)
+    parser.add_argument("--measure-engine", action="store_true")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--rpm", type=float, default=REQUESTS_PER_MIN)
+    parser.add_argument("--keep-subs", action="store_true", default=KEEP_RAW_SUBS)
+    parser.add_argument("--sub-langs", type=str, default=None)   # e.g. "en,en-GB,de"
+    parser.add_argument("--sync", action="store_true")           # only videos newer than the cached listing
+    parser.add_argument("--channels", type=str, default=None)    # file of channel URLs: batch, no prompts
     args, _ = parser.parse_known_args()
 
-    global USE_COOKIES_FILE, BROWSER_COOKIES
+    global USE_COOKIES_FILE, BROWSER_COOKIES, SUB_LANGS
+
+    if args.sub_langs:
+        SUB_LANGS = [l.strip() for l in args.sub_langs.split(",") if l.strip()]
+    print(f"Subtitles: one track per video, preferring {', '.join(SUB_LANGS)} (manual before auto)")
 
     if args.no_cookies:
         USE_COOKIES_FILE = False
@@ -234,6 +333,242 @@ def main():
             USE_COOKIES_FILE = False
             print("Cookies: none found; proceeding without cookies")
 
+    workers = max(1, args.workers)
+    dl_opts = build_dl_opts(quiet=workers > 1)  # keep parallel logs readable
+    if args.measure_engine:
+        per_video = measure_engine_setup(dl_opts)
+        ydl, setup_s = open_engine({**dl_opts, "quiet": True})
+        ydl.close()
+        print(f"Engine setup: {per_video*1000:.0f} ms per video when rebuilt each time; "
+              f"{setup_s*1000:.0f} ms once per run when reused")
+        return
+
+    pacer = AdaptivePacer(args.rpm, MIN_DELAY_S, MAX_DELAY_S, DELAY_STEP_S, AIMD_WINDOW,
+                          REQUEST_BURST, BACKOFF_SCHEDULE)
+    print(f"Pacing: {workers} worker(s) sharing an adaptive budget, starting at {args.rpm:g} requests/min")
+    engines, setup_s = [], 0.0
+    with contextlib.ExitStack() as stack:
+        for _ in range(workers):
+            ydl, took = open_engine(dl_opts, pacer)
+            engines.append(stack.enter_context(ydl))
+            setup_s += took
+        if args.channels:
+            run_batch(engines, pacer, setup_s, args.channels, args.keep_subs, args.sync)
+        else:
+            run(engines, pacer, setup_s, args.keep_subs, args.sync)
+
+def plan_channel(url: str, ydl: YoutubeDL, sync: bool = False, start_at: Optional[int] = None):
+    """
+    List a channel and pick what to fetch; None when there is nothing to do.
+
+    Returns (all_ids, slice_ids, start_at, known_dir, synced).  With ``sync``
+    and a cached listing only the new uploads are listed; they are sliced
+    together with cached IDs missing from the progress file (``synced`` True); ``known_dir`` is the channel folder from
+    captions/channels.json.  ``start_at`` None asks interactively (full
+    listings only).
+    """
+    known_dir = known_channel_dir(url) if sync else None
+    cached = load_listing(known_dir) if known_dir else []
+    synced = bool(cached)
+    if synced:
+        # sync: list only what is newer than the cache / progress file...
+        done = load_progress(os.path.join(BASE_DIR, known_dir, f"{known_dir}.progress.txt"))
+        new_ids = list_new_video_ids(url, ydl, set(cached) | done)
+        fresh = set(new_ids)
+        all_ids = new_ids + [v for v in cached if v not in fresh]
+        # ...plus anything listed before but never fetched (interrupted run,
+        # gave up on rate limits), or it would never be picked up again
+        pending = [v for v in cached if v not in fresh and v not in done]
+        if not new_ids and not pending:
+            save_listing(known_dir, url, all_ids)  # records the check
+            print("No new videos since the last listing.")
+            return None
+        print(f"Sync: {len(new_ids)} new upload(s), {len(pending)} listed earlier but not fetched yet")
+        return all_ids, new_ids + pending, 1, known_dir, synced
+    else:
+        if sync:
+            print("Sync: no cached listing for this channel yet; listing everything once")
+            start_at = 1
+        elif start_at is None:
+            start_at = ask_int("Start at which video #?", default=1, min_val=1)
+        # list IDs
+        all_ids = list_channel_video_ids(url, ydl)
+        if not all_ids:
+            print("No videos found.")
+            return None
+        end_at = len(all_ids)  # simplest flow; process to the end
+    # slice
+    slice_ids = all_ids[start_at - 1 : end_at]
+    print(f"Processing slice: #{start_at}..#{end_at} (count={len(slice_ids)})")
+    return all_ids, slice_ids, start_at, known_dir, synced
+
+def existing_numbering(channel_dir: str) -> Tuple[int, int, dict]:
+    """
+    (highest number, widest zero padding, {video id: number}) of the
+    per-video NN_<id>.txt files in ``channel_dir``.
+    """
+    top, pad, numbers = 0, 2, {}
+    for name in os.listdir(channel_dir):
+        m = PER_VIDEO_RE.match(name)
+        if m:
+            top = max(top, int(m.group(1)))
+            pad = max(pad, len(m.group(1)))
+            numbers[m.group(2)] = int(m.group(1))
+    return top, pad, numbers
+
+class ChannelJob:
+    """
+    One channel's (or single video's) folder, targets still to fetch and
+    in-order commit state.
+
+    Combined file and progress are written in list order even though videos
+    finish out of order, so the progress file stays a clean "done" record.
+    """
+
+    def __init__(self, ch_name: str, targets: List[str], absolute_index_start: int = 1,
+                 keep_subs: bool = False, continue_numbering: bool = False):
+        self.channel_safe = sanitize_filename(ch_name)
+        self.channel_dir  = os.path.join(BASE_DIR, self.channel_safe)
+        self.subs_dir     = os.path.join(self.channel_dir, SUB_DIR_NAME)
+        ensure_dir(self.channel_dir)
+        if keep_subs:
+            ensure_dir(self.subs_dir)
+        self.keep_subs = keep_subs
+
+        self.output_file   = os.path.join(self.channel_dir, f"{self.channel_safe}.txt")
+        self.progress_file = os.path.join(self.channel_dir, f"{self.channel_safe}.progress.txt")
+        self.pacing_log    = os.path.join(self.channel_dir, f"{self.channel_safe}.pacing.log")
+
+        # Resume using progress file
+        done = load_progress(self.progress_file)
+        self.done = len(done)
+        self.remaining = [u for u in targets if u.rsplit("v=", 1)[-1] not in done]
+        # per-video numbering uses absolute index (start_at + offset)
+        self.absolute_index_start = absolute_index_start
+        self.total_pad = max(2, len(str(len(targets) + absolute_index_start - 1)))
+        # ...except after a sync: list positions have shifted, so new uploads
+        # continue after the highest number already in the folder, oldest first
+        self.numbers = {}
+        if continue_numbering:
+            top, pad, numbered = existing_numbering(self.channel_dir)
+            # a video written but never committed (interrupted run) keeps its number
+            vids = [u.rsplit("v=", 1)[-1] for u in self.remaining]  # newest first
+            vids = [v for v in vids if v not in numbered]
+            self.numbers = {v: top + len(vids) - i for i, v in enumerate(vids)}
+            self.numbers.update(numbered)
+            self.total_pad = max(pad, len(str(top + len(vids))))
+        self.label = ""  # prefix for progress lines (channel name in batch mode)
+
+        self.results = {}
+        self.next_commit = 0
+        self.lock = threading.Lock()
+
+    def per_video_txt(self, rel_idx: int, vid: str) -> str:
+        abs_idx = self.numbers.get(vid) or self.absolute_index_start + rel_idx
+        return os.path.join(self.channel_dir, f"{str(abs_idx).zfill(self.total_pad)}_{vid}.txt")
+
+    def commit(self, rel_idx: int, entry):
+        with self.lock:
+            self.results[rel_idx] = entry
+            while self.next_commit in self.results:
+                entry = self.results.pop(self.next_commit)
+                self.next_commit += 1
+                if entry is None:
+                    continue  # gave up after rate limits: leave for the next run
+                vid_id, header, url, text = entry
+                append_to_output(self.output_file, header, url, text)
+                save_progress(self.progress_file, vid_id)
+
+def fetch_one(engine: YoutubeDL, pacer: AdaptivePacer, job: ChannelJob, rel_idx: int, url: str,
+              fetch_times: List[float]):
+    """Fetch one video and commit it to ``job``; ``rel_idx`` is committed exactly once, whatever happens."""
+    entry = None  # None: gave up after rate limits, left for the next run
+    try:
+        entry = _fetch_entry(engine, pacer, job, rel_idx, url, fetch_times)
+    finally:
+        job.commit(rel_idx, entry)  # later videos wait on this index in job.results
+
+def _fetch_entry(engine: YoutubeDL, pacer: AdaptivePacer, job: ChannelJob, rel_idx: int, url: str,
+                 fetch_times: List[float]):
+    vid = url.rsplit("v=", 1)[-1]
+    per_video_txt = job.per_video_txt(rel_idx, vid)
+
+    for attempt in range(len(BACKOFF_SCHEDULE) + 1):
+        print(f"\n[{job.label}{rel_idx+1}/{len(job.remaining)}] Fetching captions for: {url}")
+        try:
+            t0 = time.perf_counter()
+            vid_id, track, info = download_captions(engine, url, SUB_LANGS)
+            fetch_times.append(time.perf_counter() - t0)
+
+            if job.keep_subs and track:
+                save_raw_subtitles(job.subs_dir, vid_id, track)
+            if not track:
+                print(f"  No captions available for {vid_id}.")
+                with open(per_video_txt, "w", encoding="utf-8") as pv:
+                    pv.write("[No transcript captured]\n")
+                return vid_id, f"Video {vid_id}", url, None
+
+            lang, kind, ext, data = track
+            text = captions_to_text(data, ext, dedupe=(kind == "auto"))  # only auto captions roll
+            print(f"  ✓ Captions parsed from {vid_id}.{lang}.{ext} ({kind}, {len(text)} chars)")
+
+            # per-video
+            with open(per_video_txt, "w", encoding="utf-8") as pv:
+                pv.write(text if text else "[No transcript captured]\n")
+
+            # combined
+            title = info.get("title") or f"Video {vid_id}"
+            return vid_id, title, url, text if text else None
+        except DownloadError as e:
+            print(f"  ✗ Error: {e}")
+            if is_rate_limit_error(e):
+                print("  ⏳ Rate-limit hit. All workers backing off …")
+                if not throttle_recorded(e):  # a plain 429 was already counted (and held) by the engine
+                    pacer.record_throttle(rate_limit_hint(e), why=f"rate-limited on {vid}", hold=True, retry=url)
+                continue  # retry same URL once the pacer lets us
+            return vid, f"Video {vid}", url, None
+        except Exception as e:
+            print(f"  ✗ Error: {e}")
+            return vid, f"Video {vid}", url, None
+
+    print(f"  ✗ Still rate-limited after {len(BACKOFF_SCHEDULE)} backoffs; leaving {vid} for the next run")
+    return None
+
+def harvest(engines: List[YoutubeDL], pacer: AdaptivePacer, setup_s: float, jobs: List[ChannelJob]):
+    """Fetch every job's remaining videos with the worker pool, channels interleaved round-robin."""
+    fetch_times: List[float] = []
+    started = time.monotonic()
+
+    work = queue.Queue()
+    for row in itertools.zip_longest(*(list(enumerate(job.remaining)) for job in jobs)):
+        for job, item in zip(jobs, row):
+            if item is not None:
+                work.put((job, *item))
+
+    def worker(engine: YoutubeDL):
+        while True:
+            try:
+                job, rel_idx, url = work.get_nowait()
+            except queue.Empty:
+                return
+            fetch_one(engine, pacer, job, rel_idx, url, fetch_times)
+
+    threads = [threading.Thread(target=worker, args=(engine,), daemon=True) for engine in engines]
+    for t in threads:
+        t.start()
+    for t in threads:
+        while t.is_alive():
+            t.join(0.5)  # short joins keep Ctrl+C responsive
+
+    elapsed = time.monotonic() - started
+    if fetch_times:
+        print(f"\nEngines: {len(engines)} set up in {setup_s:.2f}s; {len(fetch_times)} fetches, "
+              f"{sum(fetch_times)/len(fetch_times):.2f}s avg per video; {elapsed/60:.1f} min")
+    print(f"Pacing: {pacer.report()}")
+
+def run(engines: List[YoutubeDL], pacer: AdaptivePacer, setup_s: float, keep_subs: bool = False,
+        sync: bool = False):
+    ydl = engines[0]  # listing / lookups
     # ── Interactive section ────────────────────────────────────────────
     is_channel = ask_yes_no("Is this a channel?", default_yes=True)
     url = ask_text("Paste the URL", default="")
@@ -242,123 +577,94 @@ def main():
         return
 
     if is_channel:
-        start_at = ask_int("Start at which video #?", default=1, min_val=1)
-        # list IDs
-        all_ids = list_channel_video_ids(url)
-        if not all_ids:
-            print("No videos found.")
+        plan = plan_channel(url, ydl, sync)
+        if not plan:
+            print("Nothing to do. Bye!")
             return
-        end_at = len(all_ids)  # simplest flow; process to the end
-        # slice
-        slice_ids = all_ids[start_at - 1 : end_at]
-        print(f"Processing slice: #{start_at}..#{end_at} (count={len(slice_ids)})")
+        all_ids, slice_ids, start_at, known_dir, synced = plan
         # prepare targets
         targets = [f"https://www.youtube.com/watch?v={vid}" for vid in slice_ids]
-        # channel name from first item
-        ch_name = resolve_channel_name_from_video(slice_ids[0]) or "captions"
+        # channel name from the folder we synced before, else from the first item
+        ch_name = known_dir or resolve_channel_name_from_video(slice_ids[0], ydl) or "captions"
         # for numbering files, use absolute index so filenames match the original list position
         absolute_index_start = start_at
     else:
         # single video
         targets = [url]
-        ch_name = resolve_channel_name_from_video(url) or "captions"
+        synced = False
+        ch_name = resolve_channel_name_from_video(url, ydl) or "captions"
         absolute_index_start = 1
 
     # ── Paths ──────────────────────────────────────────────────────────
-    channel_safe = sanitize_filename(ch_name)
-    channel_dir  = os.path.join(BASE_DIR, channel_safe)
-    subs_dir     = os.path.join(channel_dir, SUB_DIR_NAME)
-    ensure_dir(channel_dir)
-    ensure_dir(subs_dir)
-
-    output_file   = os.path.join(channel_dir, f"{channel_safe}.txt")
-    progress_file = os.path.join(channel_dir, f"{channel_safe}.progress.txt")
-
-    print(f"Writing combined to: {output_file}")
-    print(f"Progress file      : {progress_file}")
-    print(f"Subs directory     : {subs_dir}")
-
-    # Resume using progress file
-    done = load_progress(progress_file)
-    remaining = []
-    for url in targets:
-        vid = url.rsplit("v=", 1)[-1]
-        if vid not in done:
-            remaining.append(url)
-
-    print(f"Already done (from progress): {len(done)}; remaining: {len(remaining)}")
-    if not remaining:
-        print("Nothing to do. Bye!")
-        return
-
-    # yt-dlp options
-    dl_opts = build_dl_opts(subs_dir, PER_VIDEO_SLEEP_S, REQ_SLEEP_S)
+    job = ChannelJob(ch_name, targets, absolute_index_start, keep_subs, continue_numbering=synced)
 
-    processed_since_pause = 0
-    backoff_try = 0
-    total_pad = max(2, len(str(len(targets) + absolute_index_start - 1)))
+    print(f"Writing combined to: {job.output_file}")
+    print(f"Progress file      : {job.progress_file}")
+    print(f"Raw subtitles      : {job.subs_dir + ' (gzipped)' if keep_subs else 'not kept'}")
+    print(f"Pacing log         : {job.pacing_log}")
+    pacer.set_log(job.pacing_log)
+    if is_channel:
+        save_listing(job.channel_safe, url, all_ids)
+        remember_channel_dir(url, job.channel_safe)
 
-    # Loop
-    for rel_idx, url in enumerate(remaining, start=0):
-        # per-video numbering uses absolute index (start_at + offset)
-        abs_idx = absolute_index_start + rel_idx
-        vid = url.rsplit("v=", 1)[-1]
-        per_video_txt = os.path.join(channel_dir, f"{str(abs_idx).zfill(total_pad)}_{vid}.txt")
+    print(f"Already done (from progress): {job.done}; remaining: {len(job.remaining)}")
+    if not job.remaining:
+        print("Nothing to do. Bye!")
+        return
 
-        print(f"\n[{rel_idx+1}/{len(remaining)}] Fetching captions for: {url}")
+    harvest(engines, pacer, setup_s, [job])
+    print(f"\nDone – captions saved to {job.output_file}")
+
+def read_channel_list(path: str) -> List[str]:
+    """Channel URLs from a text file: one per line, blank lines and # comments ignored."""
+    urls = []
+    with open(path, "r", encoding="utf-8") as f:
+        for ln in f:
+            ln = ln.split("#", 1)[0].strip()
+            if ln and ln not in urls:
+                urls.append(ln)
+    return urls
+
+def run_batch(engines: List[YoutubeDL], pacer: AdaptivePacer, setup_s: float, channels_file: str,
+              keep_subs: bool = False, sync: bool = False):
+    """Non-interactive: every channel in ``channels_file``, one shared budget, fetched round-robin."""
+    ydl = engines[0]  # listing / lookups
+    urls = read_channel_list(channels_file)
+    print(f"Batch: {len(urls)} channel(s) from {channels_file}")
+    ensure_dir(BASE_DIR)
+    pacing_log = os.path.join(BASE_DIR, BATCH_PACING_LOG)
+    pacer.set_log(pacing_log)  # one budget, so one log
+    print(f"Pacing log         : {pacing_log}")
+
+    jobs: List[ChannelJob] = []
+    for n, url in enumerate(urls, 1):
+        print(f"\n── Channel {n}/{len(urls)}: {url}")
         try:
-            vid_id, srt_files, info = download_captions(url, dl_opts)
-
-            if not srt_files:
-                print("  No .srt captions saved.")
-                append_to_output(output_file, f"Video {vid_id}", url, None)
-                with open(per_video_txt, "w", encoding="utf-8") as pv:
-                    pv.write("[No transcript captured]\n")
-            else:
-                # pick English if present
-                choice = next((p for p in srt_files if re.search(r"\.en(\.|$)", p)), srt_files[0])
-                text = srt_to_plain_text(choice)
-                print(f"  ✓ Captions parsed from {os.path.basename(choice)} ({len(text)} chars)")
-
-                # per-video
-                with open(per_video_txt, "w", encoding="utf-8") as pv:
-                    pv.write(text if text else "[No transcript captured]\n")
-
-                # combined
-                title = info.get("title") or f"Video {vid_id}"
-                append_to_output(output_file, title, url, text if text else None)
-
-            save_progress(progress_file, vid_id)
-            backoff_try = 0
-            processed_since_pause += 1
-
-        except DownloadError as e:
-            print(f"  ✗ Error: {e}")
-            if is_rate_limit_error(e):
-                wait = BACKOFF_SCHEDULE[min(backoff_try, len(BACKOFF_SCHEDULE)-1)]
-                print(f"  ⏳ Rate-limit hit. Backing off for {wait} seconds …")
-                time.sleep(wait)
-                backoff_try += 1
-                # retry same URL
+            plan = plan_channel(url, ydl, sync, start_at=1)
+            if not plan:
                 continue
-            else:
-                append_to_output(output_file, f"Video {vid}", url, None)
-                save_progress(progress_file, vid)
-        except Exception as e:
-            print(f"  ✗ Error: {e}")
-            append_to_output(output_file, f"Video {vid}", url, None)
-            save_progress(progress_file, vid)
-
-        # batch pause
-        if BATCH_SIZE and processed_since_pause >= BATCH_SIZE:
-            print(f"\n⏸  Batch pause {BATCH_PAUSE_S}s to avoid limits …")
-            time.sleep(BATCH_PAUSE_S)
-            processed_since_pause = 0
-
-        # polite sleep between videos
-        time.sleep(random.uniform(*PER_VIDEO_SLEEP_S))
-
-    print(f"\nDone – captions saved to {output_file}")
+            all_ids, slice_ids, _, known_dir, synced = plan
+            ch_name = known_dir or resolve_channel_name_from_video(slice_ids[0], ydl) or "captions"
+        except DownloadError as e:
+            print(f"  ✗ Skipping channel: {e}")
+            continue
+        targets = [f"https://www.youtube.com/watch?v={vid}" for vid in slice_ids]
+        job = ChannelJob(ch_name, targets, 1, keep_subs, continue_numbering=synced)
+        job.label = f"{job.channel_safe} "
+        save_listing(job.channel_safe, url, all_ids)
+        remember_channel_dir(url, job.channel_safe)
+        print(f"  {job.channel_dir}: already done {job.done}; remaining {len(job.remaining)}")
+        if job.remaining:
+            jobs.append(job)
+
+    if not jobs:
+        print("\nNothing to do. Bye!")
+        return
+    print(f"\nFetching {sum(len(j.remaining) for j in jobs)} video(s) from {len(jobs)} channel(s), interleaved")
+    harvest(engines, pacer, setup_s, jobs)
+    print("\nDone – captions saved to:")
+    for job in jobs:
+        print(f"  {job.output_file}")
 
 if __name__ == "__main__":
     main()